@@ -0,0 +1,23 @@
+"""App configuration of the ``django_libs`` app."""
+from django.apps import AppConfig, apps
+from django.db.models.signals import post_delete, post_save
+
+
+class DjangoLibsConfig(AppConfig):
+    name = 'django_libs'
+
+    def ready(self):
+        from . import default_settings
+        if apps.is_installed('django_comments'):
+            import django_comments
+            from .views import invalidate_comment_cache
+            post_save.connect(invalidate_comment_cache,
+                              sender=django_comments.get_model())
+            post_delete.connect(invalidate_comment_cache,
+                                sender=django_comments.get_model())
+        if default_settings.WARM_TEMPLATES:
+            from .utils.templates import warm_templates
+            warm_templates()
+        if default_settings.PRERENDER_ERROR_PAGES:
+            from .views import prerender_error_pages
+            prerender_error_pages()
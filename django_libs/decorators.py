@@ -1,14 +1,29 @@
 """Useful decorators for Django projects."""
 from functools import wraps
+import base64
+import binascii
+import hashlib
+import hmac
 import re
+import threading
+import time
 
+from django.conf import settings
+from django.core.cache import cache
 from django.http import Http404
-from django.contrib.auth import authenticate, login
+from django.contrib.auth import authenticate, get_user_model, login
 from django.contrib.auth.models import User
-from lockfile import FileLock, AlreadyLocked, LockTimeout
 
+from . import default_settings
+from .utils.locks import CacheLock, get_lock_backend
+from .utils.ratelimit import RateLimit
 
-def lockfile(lockfile_name, lock_wait_timeout=-1):
+
+EMAIL_PATTERN = re.compile(r'.+@\w+\..+')
+
+
+def lockfile(lockfile_name, lock_wait_timeout=-1, backend=None,
+             **backend_kwargs):
     """
     Only runs the method if the lockfile is not acquired.
 
@@ -29,17 +44,16 @@ def lockfile(lockfile_name, lock_wait_timeout=-1):
       method.
     :lock_wait_timeout: Seconds to wait if lockfile is acquired. If ``-1`` we
       will not wait and just quit.
+    :backend: The lock backend, see ``django_libs.utils.locks``. Defaults to
+      the ``DJANGO_LIBS_LOCK_BACKEND`` setting.
+    :backend_kwargs: Additional arguments for the lock backend.
 
     """
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            lock = FileLock(lockfile_name)
-            try:
-                lock.acquire(lock_wait_timeout)
-            except AlreadyLocked:
-                return
-            except LockTimeout:
+            lock = get_lock_backend(backend)(lockfile_name, **backend_kwargs)
+            if not lock.acquire(lock_wait_timeout):
                 return
             try:
                 result = func(*args, **kwargs)
@@ -51,10 +65,137 @@ def lockfile(lockfile_name, lock_wait_timeout=-1):
     return decorator
 
 
+class Flight(object):
+    """A computation of a ``single_flight`` function, that callers wait for."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# The running computations of all ``single_flight`` functions by their key
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def run_single_flight(name, timeout, func, *args, **kwargs):
+    """
+    Runs the function, unless another process already does.
+
+    In that case, it waits until the other process has stored the result in
+    the cache and returns it instead.
+
+    """
+    lock = CacheLock(name, ttl=timeout)
+    result_key = '{0}:result'.format(lock.key)
+    while not lock.try_acquire():
+        while lock.cache.get(lock.key) is not None:
+            time.sleep(lock.poll_interval)
+        result = lock.cache.get(result_key)
+        if result is not None:
+            return result[0]
+        # The other process failed, so try to compute it here
+    lock.cache.delete(result_key)
+    try:
+        result = func(*args, **kwargs)
+        # Wrapped in a tuple to tell a result of ``None`` from a cache miss
+        lock.cache.set(result_key, (result, ), timeout)
+    finally:
+        lock.release()
+    return result
+
+
+def single_flight(key=None, timeout=60):
+    """
+    Lets concurrent calls with the same arguments share one computation.
+
+    The first caller runs the function, all other callers wait for its
+    result. Threads wait for a ``threading.Event``, other processes for a
+    lock in the cache, so use a cache, that is shared by all app servers.
+    Results must be picklable::
+
+        @single_flight(key=lambda site_id: str(site_id))
+        def build_sitemap(site_id):
+            ...
+
+    :key: A function that returns the key for the arguments of a call. Calls
+      with the same key share their result. Defaults to the ``repr`` of the
+      arguments.
+    :timeout: Seconds until the cache lock expires, if the process dies.
+
+    """
+    def decorator(func):
+        prefix = 'single_flight:{0}.{1}'.format(
+            func.__module__, func.__qualname__)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if key is None:
+                name = '{0}:{1!r}'.format(
+                    prefix, (args, sorted(kwargs.items())))
+            else:
+                name = '{0}:{1}'.format(prefix, key(*args, **kwargs))
+            with _flights_lock:
+                flight = _flights.get(name)
+                is_leader = flight is None
+                if is_leader:
+                    flight = _flights[name] = Flight()
+            if not is_leader:
+                flight.done.wait()
+                if flight.error is not None:
+                    raise flight.error
+                return flight.result
+            try:
+                flight.result = run_single_flight(
+                    name, timeout, func, *args, **kwargs)
+            except Exception as ex:
+                flight.error = ex
+                raise
+            finally:
+                with _flights_lock:
+                    del _flights[name]
+                flight.done.set()
+            return flight.result
+
+        return wrapper
+    return decorator
+
+
+def ratelimit(rate, key='ip', group=None):
+    """
+    Returns ``429 Too Many Requests``, if a client calls a view too often.
+
+    Use it like so::
+
+        @ratelimit('100/m', key='user')
+        def expensive_view(request):
+            ...
+
+    :rate: The allowed number of requests, e.g. ``'100/m'`` or ``'10/5s'``.
+    :key: ``'ip'``, ``'user'`` or a function, that returns the key of the
+      client for a request. See ``django_libs.utils.ratelimit.RateLimit``.
+    :group: Views of the same group share their limit. Defaults to the name
+      of the view.
+
+    """
+    def decorator(func):
+        limit = RateLimit(rate, key=key, group=group or '{0}.{1}'.format(
+            func.__module__, func.__qualname__))
+
+        @wraps(func)
+        def wrapper(request, *args, **kwargs):
+            retry_after = limit.hit(request)
+            if retry_after is not None:
+                return limit.get_response(retry_after)
+            return func(request, *args, **kwargs)
+
+        return wrapper
+    return decorator
+
+
 def get_username(identifier):
     """Checks if a string is a email adress or not."""
-    pattern = re.compile(r'.+@\w+\..+')
-    if pattern.match(identifier):
+    if EMAIL_PATTERN.match(identifier):
         try:
             user = User.objects.get(email=identifier)
         except User.DoesNotExist:
@@ -65,6 +206,38 @@ def get_username(identifier):
         return identifier
 
 
+def get_http_auth_cache_key(credentials):
+    """Returns the cache key for the given basic auth credentials."""
+    # The credentials must never end up in the cache in plain text
+    digest = hmac.new(settings.SECRET_KEY.encode('utf-8'), credentials,
+                      hashlib.sha256).hexdigest()
+    return 'django_libs:http_auth:{0}'.format(digest)
+
+
+def get_cached_http_auth_user(cache_key):
+    """
+    Returns the user of recently verified credentials.
+
+    Returns ``None``, if the credentials haven't been verified recently or if
+    the password of the user has been changed since.
+
+    """
+    cached = cache.get(cache_key)
+    if cached is None:
+        return None
+    pk, backend, auth_hash = cached
+    try:
+        user = get_user_model()._default_manager.get(pk=pk)
+    except get_user_model().DoesNotExist:
+        return None
+    if not getattr(user, 'is_active', True):
+        return None
+    if not hmac.compare_digest(user.get_session_auth_hash(), auth_hash):
+        return None
+    user.backend = backend
+    return user
+
+
 def http_auth(func):
     @wraps(func)
     def _decorator(request, *args, **kwargs):
@@ -77,10 +250,24 @@ def http_auth(func):
         if 'HTTP_AUTHORIZATION' in request.META.keys():
             authmeth, auth = request.META['HTTP_AUTHORIZATION'].split(' ', 1)
             if authmeth.lower() == 'basic':
-                auth = auth.strip().decode('base64')
-                identifier, password = auth.split(':', 1)
-                username = get_username(identifier)
-                user = authenticate(username=username, password=password)
+                try:
+                    credentials = base64.b64decode(auth.strip(), validate=True)
+                    identifier, password = credentials.decode(
+                        'utf-8').split(':', 1)
+                except (binascii.Error, UnicodeDecodeError, ValueError):
+                    raise Http404
+                timeout = default_settings.HTTP_AUTH_CACHE_TIMEOUT
+                cache_key = get_http_auth_cache_key(credentials)
+                user = None
+                if timeout:
+                    user = get_cached_http_auth_user(cache_key)
+                if user is None:
+                    username = get_username(identifier)
+                    user = authenticate(username=username, password=password)
+                    if user and timeout:
+                        cache.set(cache_key, (
+                            user.pk, user.backend,
+                            user.get_session_auth_hash()), timeout)
                 if user:
                     login(request, user)
                     return func(request, *args, **kwargs)
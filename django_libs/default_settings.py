@@ -28,3 +28,38 @@ TEST_EMAIL_BACKEND_RECIPIENTS = getattr(
 
 # The default paginate by setting for all comment views
 COMMENTS_PAGINATE_BY = getattr(settings, 'COMMENTS_PAGINATE_BY', 10)
+
+# Seconds to cache the rendered pages of the ``PaginatedCommentAJAXView``.
+# Pages are invalidated as soon as a comment is saved or deleted. They show
+# relative times like "2 minutes ago", so keep it short. Set it to ``0`` to
+# disable the cache.
+COMMENTS_CACHE_TIMEOUT = getattr(settings, 'COMMENTS_CACHE_TIMEOUT', 60)
+
+# If True, all templates are compiled when the app registry is ready, so they
+# are already in the cached template loader when the first request comes in.
+WARM_TEMPLATES = getattr(settings, 'DJANGO_LIBS_WARM_TEMPLATES', False)
+
+# If True, the error pages of the ``PrerenderedHttp404View`` and
+# ``PrerenderedHttp500View`` are rendered when the app registry is ready
+# instead of on their first request.
+PRERENDER_ERROR_PAGES = getattr(
+    settings, 'DJANGO_LIBS_PRERENDER_ERROR_PAGES', False)
+
+# The serializer used by the ``JSONResponseMixin``. Either the name of a
+# serializer in ``django_libs.utils.serializers.SERIALIZERS`` or the path to a
+# function. Set it to ``'orjson'`` for faster, but compact output.
+JSON_SERIALIZER = getattr(settings, 'DJANGO_LIBS_JSON_SERIALIZER', 'json')
+
+# Seconds to remember credentials, that have been verified by the
+# ``http_auth`` decorator, so that the password isn't hashed on every request.
+# Changing the password invalidates them. Set it to ``0`` to disable the cache.
+HTTP_AUTH_CACHE_TIMEOUT = getattr(
+    settings, 'DJANGO_LIBS_HTTP_AUTH_CACHE_TIMEOUT', 60)
+
+# The default lock backend of the ``lockfile`` decorator. Either the name of a
+# backend in ``django_libs.utils.locks.LOCK_BACKENDS`` or the path to a class.
+LOCK_BACKEND = getattr(settings, 'DJANGO_LIBS_LOCK_BACKEND', 'file')
+
+# Tuples of a path pattern, a rate and a key for the ``RateLimitMiddleware``,
+# e.g. ``[(r'^/api/', '100/m', 'user')]``.
+RATELIMITS = getattr(settings, 'DJANGO_LIBS_RATELIMITS', [])
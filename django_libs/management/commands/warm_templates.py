@@ -0,0 +1,40 @@
+"""Custom admin command to load all templates into the template caches."""
+import time
+
+from django.core.management.base import BaseCommand
+
+from ...utils.templates import warm_templates
+
+
+class Command(BaseCommand):
+    help = 'Compiles all templates, so they are cached before the first request.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-e', '--extension', action='append', dest='extensions',
+            help='File extension of the templates to compile. Defaults to'
+                 ' "html" and "txt". Can be used multiple times.')
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Number of threads that compile the templates.')
+
+    def handle(self, **options):
+        start = time.perf_counter()
+        results = warm_templates(
+            extensions=options['extensions'] or ('html', 'txt'),
+            workers=options['workers'])
+        # The threads compile in parallel, so the sum of the compile times
+        # would overstate the time
+        elapsed = time.perf_counter() - start
+        failures = 0
+        for name, seconds, exception in results:
+            if exception is not None:
+                failures += 1
+                self.stderr.write('Failed to compile {0}: {1}'.format(
+                    name, exception))
+            elif options['verbosity'] > 1:
+                self.stdout.write('Compiled {0} in {1:.2f}ms'.format(
+                    name, seconds * 1000))
+        self.stdout.write(
+            'Compiled {0} templates in {1:.2f}s, {2} failed.'.format(
+                len(results) - failures, elapsed, failures))
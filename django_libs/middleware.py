@@ -7,6 +7,9 @@ from django.core.mail import mail_managers
 from django.http import HttpResponseRedirect
 from django.utils.encoding import force_text
 
+from . import default_settings
+from .utils.ratelimit import RateLimit
+
 
 class AjaxRedirectMiddleware:
     """
@@ -45,6 +48,34 @@ class ErrorMiddleware:
             request.META['USER'] = request.user.email
 
 
+class RateLimitMiddleware:
+    """
+    Limits the number of requests of a client to the configured paths.
+
+    Add tuples of a path pattern, a rate and a key to the
+    ``DJANGO_LIBS_RATELIMITS`` setting. The pattern is matched against the
+    request path, the rate and the key are passed to the ``RateLimit``::
+
+        DJANGO_LIBS_RATELIMITS = [
+            (r'^/api/', '100/m', 'user'),
+        ]
+
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limits = [
+            (re.compile(pattern), RateLimit(rate, key=key, group=pattern))
+            for pattern, rate, key in default_settings.RATELIMITS]
+
+    def __call__(self, request):
+        for pattern, limit in self.limits:
+            if pattern.search(request.path):
+                retry_after = limit.hit(request)
+                if retry_after is not None:
+                    return limit.get_response(retry_after)
+        return self.get_response(request)
+
+
 class SSLRedirect:
     """
     Redirects all non-SSL requests to the SSL versions.
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-19 16:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Lock',
+            fields=[
+                ('name', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('token', models.CharField(max_length=32)),
+                ('expires', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -1,6 +1,6 @@
 """Models of the ``django_libs`` projects."""
 from django.core.validators import RegexValidator
-from django.db.models import CharField
+from django.db.models import CharField, DateTimeField, Model
 
 try:
     from south.modelsinspector import add_introspection_rules
@@ -25,3 +25,17 @@ class ColorField(CharField):
     def formfield(self, **kwargs):
         kwargs['widget'] = ColorPickerWidget
         return super(ColorField, self).formfield(**kwargs)
+
+
+class Lock(Model):
+    """
+    Lock of the ``DatabaseLock`` on databases without advisory locks.
+
+    :name: SHA1 hex digest of the name of the lock.
+    :token: Identifies the holder of the lock.
+    :expires: The lock can be taken over after this time.
+
+    """
+    name = CharField(max_length=40, primary_key=True)
+    token = CharField(max_length=32)
+    expires = DateTimeField()
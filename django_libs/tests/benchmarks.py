@@ -0,0 +1,180 @@
+"""
+Benchmarks for the performance critical parts of ``django_libs``.
+
+They are not part of the test suite. Run all of them or only some with::
+
+    python -m django_libs.tests.benchmarks
+    python -m django_libs.tests.benchmarks json_serializers
+
+"""
+import datetime
+import itertools
+import os
+import sys
+import timeit
+from decimal import Decimal
+
+
+def _print_row(*columns):
+    print(''.join('{0:<16}'.format(column) for column in columns))
+
+
+def _timeit(func, number=None):
+    """Returns the average seconds of a call to ``func``."""
+    timer = timeit.Timer(func)
+    if number is None:
+        number, _ = timer.autorange()
+    return min(timer.repeat(repeat=3, number=number)) / number
+
+
+def benchmark_json_serializers():
+    from ..utils.serializers import SERIALIZERS, json_dumps
+
+    row = {
+        'id': 12345,
+        'title': 'A title with some words',
+        'price': Decimal('19.99'),
+        'created': datetime.datetime(2020, 1, 2, 3, 4, 5),
+        'tags': ['foo', 'bar'],
+    }
+    row_size = len(json_dumps(row))
+    _print_row('payload', *sorted(SERIALIZERS))
+    for label, size in (('1KB', 1024), ('100KB', 100 * 1024),
+                        ('1MB', 1024 * 1024), ('10MB', 10 * 1024 * 1024)):
+        payload = {'rows': [row] * (size // row_size or 1)}
+        number = 1 if size > 1024 * 1024 else None
+        _print_row(label, *[
+            '{0:.3f}ms'.format(_timeit(
+                lambda: SERIALIZERS[name](payload), number) * 1000)
+            for name in sorted(SERIALIZERS)])
+
+
+def benchmark_locks():
+    import shutil
+    import tempfile
+
+    from django.core.management import call_command
+
+    from ..utils.locks import LOCK_BACKENDS
+
+    # The database backend needs the table of the ``Lock`` model
+    call_command('migrate', 'django_libs', verbosity=0)
+
+    tmp_dir = tempfile.mkdtemp()
+    name = os.path.join(tmp_dir, 'benchmark')
+
+    def acquire_and_release(backend):
+        lock = backend(name)
+        lock.acquire()
+        lock.release()
+
+    _print_row('backend', 'acquire+release')
+    for backend_name, backend in sorted(LOCK_BACKENDS.items()):
+        _print_row(backend_name, '{0:.3f}ms'.format(
+            _timeit(lambda: acquire_and_release(backend)) * 1000))
+    shutil.rmtree(tmp_dir)
+
+
+def benchmark_html_to_plain_text():
+    from django.test.utils import override_settings
+
+    from ..utils.converter import BeautifulSoup, html_to_plain_text
+
+    modes = [('tolerant', False)]
+    if BeautifulSoup is not None:
+        modes.append(('beautifulsoup', True))
+    rows = (
+        ('', '<tr><td><p>Some <a href="https://example.com">text</a></p>'
+             '</td><td><ul><li>foo</li><li>bar<br />baz</li></ul></td></tr>\n'),
+        # Void elements without end tags
+        (' br/img', '<tr><td><p>line<br>more<img src=x></p></td></tr>\n'),
+    )
+    _print_row('html', *[name for name, use_beautifulsoup in modes])
+    for (label, size), (kind, row) in itertools.product(
+            (('10KB', 10 * 1024), ('100KB', 100 * 1024),
+             ('1MB', 1024 * 1024), ('5MB', 5 * 1024 * 1024)), rows):
+        label += kind
+        html = '<table>{0}</table>'.format(row * (size // len(row)))
+        number = 1 if size > 1024 * 1024 else None
+        columns = []
+        for name, use_beautifulsoup in modes:
+            with override_settings(
+                    HTML2PLAINTEXT_USE_BEAUTIFULSOUP=use_beautifulsoup):
+                columns.append('{0:.3f}ms'.format(_timeit(
+                    lambda: html_to_plain_text(html), number) * 1000))
+        _print_row(label, *columns)
+
+
+def benchmark_mass_email():
+    import time
+
+    from django.test.utils import override_settings
+
+    from ..utils.email import send_email, send_mass_email
+    from .smtp_sink import SMTPSink
+
+    def get_messages(count):
+        return [({'name': 'user{0}'.format(i), 'token': i},
+                 ['user{0}@example.com'.format(i)]) for i in range(count)]
+
+    def send_single(count):
+        for context, recipients in get_messages(count):
+            send_email(None, context, 'mass_subject.html', 'mass_email.html',
+                       'info@example.com', recipients)
+
+    def send_mass(count):
+        send_mass_email(None, get_messages(count), 'mass_subject.html',
+                        'mass_email.html', 'info@example.com')
+
+    _print_row('messages', 'send_email', 'send_mass_email')
+    for count in (10, 100, 1000):
+        columns = []
+        for func in (send_single, send_mass):
+            with SMTPSink() as sink, override_settings(
+                    EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                    EMAIL_HOST='127.0.0.1', EMAIL_PORT=sink.port,
+                    DOMAIN='example.com'):
+                start = time.perf_counter()
+                func(count)
+                columns.append('{0:.0f} msgs/s'.format(
+                    count / (time.perf_counter() - start)))
+        _print_row(count, *columns)
+
+
+def benchmark_email_template():
+    from django.template.loader import render_to_string
+
+    from ..utils.email import EmailTemplate
+
+    _print_row('news', 'full render', 'EmailTemplate')
+    for count in (0, 10, 100):
+        context = {
+            'domain': 'example.com', 'protocol': 'https://',
+            'news': [{'url': '/news/{0}/'.format(i), 'title': 'News & more'}
+                     for i in range(count)]}
+        personal = {'name': 'Jane <jane@example.com>', 'token': 'abc123'}
+        full_context = dict(context, **personal)
+        template = EmailTemplate('mass_email.html', personal, context)
+        _print_row(count, *[
+            '{0:.3f}ms'.format(_timeit(func) * 1000) for func in (
+                lambda: render_to_string('mass_email.html', full_context),
+                lambda: template.render(personal))])
+
+
+BENCHMARKS = {
+    'email_template': benchmark_email_template,
+    'html_to_plain_text': benchmark_html_to_plain_text,
+    'json_serializers': benchmark_json_serializers,
+    'locks': benchmark_locks,
+    'mass_email': benchmark_mass_email,
+}
+
+
+if __name__ == '__main__':
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE',
+                          'django_libs.tests.test_settings')
+    import django
+    django.setup()
+    for name in sys.argv[1:] or sorted(BENCHMARKS):
+        print('\n{0}'.format(name))
+        BENCHMARKS[name]()
@@ -0,0 +1,199 @@
+"""Tests for the decorators of ``django-libs``."""
+import base64
+import threading
+import time
+from unittest.mock import patch
+
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.cache import cache
+from django.http import Http404, HttpResponse
+from django.test import TestCase
+from django.test.client import RequestFactory
+
+from ..decorators import (
+    get_username,
+    http_auth,
+    lockfile,
+    ratelimit,
+    single_flight,
+)
+from ..utils.locks import CacheLock
+
+
+@http_auth
+def protected_view(request):
+    """Used to test the ``http_auth`` decorator."""
+    return HttpResponse('ok')
+
+
+class LockfileTestCase(TestCase):
+    longMessage = True
+
+    def setUp(self):
+        cache.clear()
+
+    def test_decorator(self):
+        @lockfile('command_name', backend='cache', ttl=10)
+        def command():
+            return 'done'
+
+        self.assertEqual(command(), 'done')
+        lock = CacheLock('command_name')
+        lock.acquire()
+        self.assertIsNone(command(), msg=(
+            'Should not run the function, if the lock is acquired.'))
+        lock.release()
+
+
+class SingleFlightTestCase(TestCase):
+    longMessage = True
+
+    def setUp(self):
+        cache.clear()
+        self.calls = []
+
+    def compute(self, value):
+        self.calls.append(value)
+        time.sleep(0.2)
+        return value * 2
+
+    def run_concurrently(self, func, args_list):
+        results = [None] * len(args_list)
+        barrier = threading.Barrier(len(args_list))
+
+        def call(index, args):
+            barrier.wait()
+            results[index] = func(*args)
+
+        threads = [threading.Thread(target=call, args=(index, args))
+                   for index, args in enumerate(args_list)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_decorator(self):
+        func = single_flight()(self.compute)
+        results = self.run_concurrently(func, [(21, )] * 100)
+        self.assertEqual(self.calls, [21], msg=(
+            'Should only compute the result once for 100 concurrent calls.'))
+        self.assertEqual(results, [42] * 100, msg=(
+            'Should return the result to all callers.'))
+
+        self.calls = []
+        results = self.run_concurrently(func, [(1, ), (2, ), (1, )])
+        self.assertEqual(sorted(self.calls), [1, 2], msg=(
+            'Should compute the results of different arguments.'))
+        self.assertEqual(results, [2, 4, 2])
+
+        self.assertEqual(func(21), 42)
+        self.assertEqual(len(self.calls), 3, msg=(
+            'Should compute the result again, once the computation is done.'))
+
+    def test_other_process(self):
+        func = single_flight(key=lambda value: 'foo')(self.compute)
+        lock = CacheLock('single_flight:{0}.{1}:foo'.format(
+            self.compute.__module__, self.compute.__qualname__))
+        lock.acquire()
+
+        def finish():
+            # Simulate another process, that computes the result
+            time.sleep(0.2)
+            cache.set('{0}:result'.format(lock.key), (10, ))
+            lock.release()
+
+        thread = threading.Thread(target=finish)
+        thread.start()
+        self.assertEqual(func(1), 10, msg=(
+            'Should wait for the result of the other process.'))
+        thread.join()
+        self.assertEqual(self.calls, [])
+
+    def test_error(self):
+        def fail():
+            self.calls.append(1)
+            time.sleep(0.2)
+            raise ValueError
+
+        func = single_flight()(fail)
+        errors = []
+
+        def call():
+            try:
+                func()
+            except ValueError:
+                errors.append(1)
+
+        self.run_concurrently(call, [()] * 5)
+        self.assertEqual((len(self.calls), len(errors)), (1, 5), msg=(
+            'Should raise the error of the computation in all callers.'))
+
+
+class RatelimitTestCase(TestCase):
+    longMessage = True
+
+    def setUp(self):
+        cache.clear()
+
+    def test_decorator(self):
+        view = ratelimit('2/h')(lambda request: HttpResponse('ok'))
+        request = RequestFactory().get('/')
+        self.assertEqual(view(request).status_code, 200)
+        self.assertEqual(view(request).status_code, 200)
+        response = view(request)
+        self.assertEqual(response.status_code, 429, msg=(
+            'Should reject requests above the limit.'))
+        self.assertIn('Retry-After', response)
+
+
+class GetUsernameTestCase(TestCase):
+    longMessage = True
+
+    def test_function(self):
+        User.objects.create(username='foo', email='foo@example.com')
+        self.assertEqual(get_username('foo@example.com'), 'foo', msg=(
+            'Should return the username of the user with this email.'))
+        self.assertEqual(get_username('bar'), 'bar', msg=(
+            'Should return the identifier, if it is not an email.'))
+        self.assertRaises(Http404, get_username, 'bar@example.com')
+
+
+class HttpAuthTestCase(TestCase):
+    longMessage = True
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='foo')
+        self.user.set_password('secret')
+        self.user.save()
+
+    def get(self, credentials):
+        auth = base64.b64encode(credentials.encode('utf-8')).decode('ascii')
+        req = RequestFactory().get(
+            '/', HTTP_AUTHORIZATION='Basic {0}'.format(auth))
+        req.user = AnonymousUser()
+        SessionMiddleware(lambda request: None).process_request(req)
+        return protected_view(req)
+
+    def test_decorator(self):
+        with patch('django_libs.decorators.authenticate',
+                   wraps=authenticate) as authenticate_mock:
+            self.assertEqual(self.get('foo:secret').content, b'ok')
+            self.assertEqual(self.get('foo:secret').content, b'ok')
+            self.assertEqual(authenticate_mock.call_count, 1, msg=(
+                'Should only verify the password on the first request.'))
+
+            self.user.set_password('new')
+            self.user.save()
+            self.assertRaises(Http404, self.get, 'foo:secret')
+            self.assertEqual(authenticate_mock.call_count, 2, msg=(
+                'Should verify the password again, if it has been changed.'))
+
+        self.assertRaises(Http404, self.get, 'foo:wrong')
+        self.assertRaises(Http404, self.get, 'foo')
+        req = RequestFactory().get('/', HTTP_AUTHORIZATION='Basic foo!')
+        req.user = AnonymousUser()
+        self.assertRaises(Http404, protected_view, req)
@@ -1,4 +1,10 @@
 """Tests for the management commands of the ``django_libs`` app."""
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
 from django.core.management import call_command
 from django.test import TestCase
 from django.utils.timezone import now, timedelta
@@ -22,3 +28,48 @@ class CleanupMailerMessagelogTestCase(TestCase):
         self.assertEqual(MessageLog.objects.all().count(), 2)
         self.assertFalse(call_command('cleanup_mailer_messagelog'))
         self.assertEqual(MessageLog.objects.all().count(), 1)
+
+
+class WarmTemplatesTestCase(TestCase):
+    """Tests for the ``warm_templates`` management command."""
+    longMessage = True
+
+    def setUp(self):
+        self.template_dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.template_dir, 'partials'))
+        with open(os.path.join(self.template_dir, 'ok.html'), 'w') as f:
+            f.write('{% if foo %}{{ foo }}{% endif %}')
+        with open(os.path.join(
+                self.template_dir, 'partials', 'broken.txt'), 'w') as f:
+            f.write('{% if foo %}')
+        with open(os.path.join(self.template_dir, 'ignored.js'), 'w') as f:
+            f.write('{% if foo %}')
+
+    def tearDown(self):
+        shutil.rmtree(self.template_dir)
+
+    def test_command(self):
+        stdout, stderr = StringIO(), StringIO()
+        with self.settings(TEMPLATES=[{
+                'BACKEND': 'django.template.backends.django.DjangoTemplates',
+                'DIRS': [self.template_dir]}]):
+            call_command('warm_templates', verbosity=2, stdout=stdout,
+                         stderr=stderr)
+        self.assertIn('Compiled ok.html', stdout.getvalue(), msg=(
+            'Should report the compile time of each template.'))
+        self.assertIn('Compiled 1 templates', stdout.getvalue(), msg=(
+            'Should report a summary.'))
+        self.assertIn('Failed to compile partials/broken.txt',
+                      stderr.getvalue(), msg=('Should report failures.'))
+        self.assertNotIn('ignored.js', stderr.getvalue(), msg=(
+            'Should only compile templates with the given extensions.'))
+
+    def test_elapsed_time(self):
+        stdout = StringIO()
+        with patch('django_libs.management.commands.warm_templates'
+                   '.warm_templates', return_value=[
+                       ('a.html', 10, None), ('b.html', 10, None)]):
+            call_command('warm_templates', stdout=stdout)
+        self.assertIn('Compiled 2 templates in 0.00s', stdout.getvalue(),
+                      msg=('Should report the elapsed time, not the sum of'
+                           ' the compile times of the threads.'))
@@ -0,0 +1,76 @@
+"""A local SMTP server, that accepts and keeps all messages."""
+import socketserver
+import threading
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough SMTP for ``smtplib``."""
+    def reply(self, line):
+        self.wfile.write('{0}\r\n'.format(line).encode('ascii'))
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        sent = 0
+        self.reply('220 localhost SMTP sink')
+        for line in self.rfile:
+            command = line.decode('ascii').strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 localhost')
+            elif command.startswith('RCPT TO:') and 'REFUSED' in command:
+                self.reply('550 Refused')
+            elif command.startswith('DATA'):
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                for data_line in self.rfile:
+                    if data_line == b'.\r\n':
+                        break
+                    data.append(data_line)
+                with server.lock:
+                    server.messages.append(b''.join(data))
+                self.reply('250 OK')
+                sent += 1
+                if sent == server.max_messages_per_connection:
+                    # Drop the connection like servers, that limit the
+                    # number of messages per connection
+                    return
+            elif command.startswith('QUIT'):
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """
+    Runs an SMTP server on a free local port in a background thread.
+
+    :max_messages_per_connection: Closes the connection after this number of
+      messages.
+
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, max_messages_per_connection=None):
+        socketserver.ThreadingTCPServer.__init__(
+            self, ('127.0.0.1', 0), SMTPSinkHandler)
+        self.max_messages_per_connection = max_messages_per_connection
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = []
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def __enter__(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
@@ -19,7 +19,10 @@ urlpatterns = [
         anonymous_view=anonymous_view,
         anonymous_view_kwargs=anonymous_view_kwargs),
         name='dummy_hybrid'),
+    path('comments/', views.PaginatedCommentAJAXView.as_view(), name='comments'),
     path('update-session/', views.UpdateSessionAJAXView.as_view(), name='update_session'),
+    path('update-session-and-cookies/', views.UpdateSessionAndCookiesAJAXView.as_view(),
+         name='update_session_and_cookies'),
     path('update-cookie/', views.UpdateCookieAJAXView.as_view(), name='update_cookie'),
     re_path(r'^prototype/(?P<template_path>.*)$', views.RapidPrototypingView.as_view(), name='prototype'),
 ]
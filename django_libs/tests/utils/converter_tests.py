@@ -1,9 +1,75 @@
 """Tests for the converter utils of ``django_libs``."""
 import os
+import tracemalloc
+from unittest import skipIf
+from unittest.mock import patch
 
 from django.test import TestCase
 
-from ...utils.converter import html_to_plain_text
+from ...utils.converter import (
+    BeautifulSoup,
+    HTML2PlainParser,
+    TolerantHTML2PlainParser,
+    clear_html_to_plain_text_cache,
+    get_html_to_plain_text_cache_info,
+    html_to_plain_text,
+    iter_html_to_plain_text,
+)
+
+
+# Malformed html and the same html after normalizing it with BeautifulSoup
+# (except for the entries in ``BEAUTIFULSOUP_DIFFERENCES``)
+CORPUS = [
+    ('<p>Unclosed <b>bold<p>Next</p>',
+     '<p>Unclosed <b>bold<p>Next</p></b></p>'),
+    ('<table><tr><td>A<td>B</tr><tr><td>C</table>',
+     '<table><tr><td>A<td>B</td></td></tr><tr><td>C</td></tr></table>'),
+    ('<ul><li>One<li>Two</ul>Stray</span> text',
+     '<ul><li>One<li>Two</li></li></ul>Stray text'),
+    ('Line<br>break</br><img src="x.png">after',
+     'Line<br/>break<img src="x.png"/>after'),
+    ('<div>  \n  <a href="https://example.com?a=1&amp;b=2">Link</a>\t</div>',
+     '<div>\n<a href="https://example.com?a=1&amp;b=2">Link</a> </div>'),
+    ('<pre>  keep\n  </pre><!-- comment --><p>&lt;escaped&gt; &amp; &nbsp;</p>',
+     '<pre>  keep\n  </pre><!-- comment --><p>&lt;escaped&gt; &amp; \xa0</p>'),
+    ('<p>Fish &chips; here</p>', '<p>Fish &amp;chips; here</p>'),
+]
+
+# The plain text of html, that BeautifulSoup converts differently
+BEAUTIFULSOUP_DIFFERENCES = {
+    # BeautifulSoup drops the ``;`` of unknown entities
+    '<p>Fish &chips; here</p>': 'Fish &chips here',
+}
+
+
+class TolerantHTML2PlainParserTestCase(TestCase):
+    """Tests for the ``TolerantHTML2PlainParser`` class."""
+    longMessage = True
+
+    def test_corpus(self):
+        for html, normalized_html in CORPUS:
+            parser = HTML2PlainParser()
+            parser.feed(normalized_html)
+            tolerant_parser = TolerantHTML2PlainParser()
+            tolerant_parser.feed(html)
+            tolerant_parser.close()
+            self.assertEqual(tolerant_parser.text, parser.text, msg=(
+                'Should convert {0!r} like the normalized html.'.format(
+                    html)))
+
+    @skipIf(BeautifulSoup is None, 'BeautifulSoup is not installed')
+    def test_beautifulsoup(self):
+        for html, normalized_html in CORPUS:
+            with self.settings(HTML2PLAINTEXT_USE_BEAUTIFULSOUP=True):
+                expected = html_to_plain_text(html)
+            if html in BEAUTIFULSOUP_DIFFERENCES:
+                self.assertEqual(
+                    expected, BEAUTIFULSOUP_DIFFERENCES[html], msg=(
+                        'Should document the difference for {0!r}.'.format(
+                            html)))
+                continue
+            self.assertEqual(html_to_plain_text(html), expected, msg=(
+                'Should convert {0!r} like BeautifulSoup.'.format(html)))
 
 
 class HTMLToPlainTextTestCase(TestCase):
@@ -27,17 +93,25 @@ class HTMLToPlainTextTestCase(TestCase):
         )
         self.assertEqual(
             html_to_plain_text(html),
-            (
-                '* List element                            '
-                '\n  * List element                            '
-                '\n  * List element'
-            ),
+            '* List element\n  * List element\n  * List element',
             msg='Should return a formatted plain text.')
         path = os.path.dirname(os.path.abspath(__file__)) + ('/../test_app/templates/html_email.html')
         with open(path, 'r') as file:
             self.assertIn('[1]: *|ARCHIVE|*\n', html_to_plain_text(file.readlines()), msg=(
                 'Should return a formatted plain text.'))
 
+    def test_bytes(self):
+        html = '<p>café</p>'.encode('utf-8')
+        self.assertEqual(html_to_plain_text([html[:-5], html[-5:]]), 'café',
+                         msg=('Should decode chunks, that end in the middle'
+                              ' of a character.'))
+
+    @skipIf(BeautifulSoup is None, 'BeautifulSoup is not installed')
+    def test_encoding(self):
+        self.assertEqual(
+            html_to_plain_text('<p>café</p>'.encode('latin-1')), 'café',
+            msg=('Should let BeautifulSoup detect other encodings.'))
+
     def test_replace_links(self):
         html = (
             """
@@ -46,7 +120,7 @@ class HTMLToPlainTextTestCase(TestCase):
             <span>T3</span>
             """
         )
-        expected = "T1 link[1] T2            \n            T3\n\n[1]: www.example.com\n"
+        expected = "T1 link[1] T2\nT3\n\n[1]: www.example.com\n"
         result = html_to_plain_text(html)
         self.assertEqual(result, expected, msg=('Should replace links nicely'))
 
@@ -59,5 +133,125 @@ class HTMLToPlainTextTestCase(TestCase):
             """
         )
         result = html_to_plain_text(html)
-        self.assertEqual(result, 'Text1\nText2            \n\n            Text3', msg=(
+        self.assertEqual(result, 'Text1\nText2\n\nText3', msg=(
             'Should replace <br/> nicely'))
+
+    def test_replace_table_rows(self):
+        html = (
+            '<table><tr><td>A</td><td>B</td></tr><tr></tr>'
+            '<tr><td>C</td></tr></table>'
+        )
+        stroke = '------------------------------\n'
+        self.assertEqual(
+            html_to_plain_text(html),
+            '{0}A\nB\n{0}C\n{0}'.format(stroke).strip(), msg=(
+                'Should separate table rows with strokes and remove the'
+                ' strokes of empty rows.'))
+        with self.settings(HTML2PLAINTEXT_STROKE_TEXT='==\n'):
+            self.assertEqual(
+                html_to_plain_text(html), '==\nA\nB\n==\nC\n==', msg=(
+                    'Should use the stroke text setting.'))
+
+    def test_parser_text(self):
+        parser = HTML2PlainParser()
+        parser.feed('<p>Text <a href="https://a">one</a></p><tr></tr>')
+        self.assertEqual(parser.text, '\nText \none[1]', msg=(
+            'Should return the text, that has been converted so far.'))
+        parser.text = 'foo'
+        parser.feed('<br />bar')
+        self.assertEqual(parser.text, 'foo\nbar', msg=(
+            'Should continue with the text, that has been set.'))
+
+
+class HTMLToPlainTextCacheTestCase(TestCase):
+    """Tests for the cache of the ``html_to_plain_text`` function."""
+    longMessage = True
+
+    def setUp(self):
+        clear_html_to_plain_text_cache()
+
+    def test_cache(self):
+        html = '<p>Hello <a href="https://example.com">World</a></p>'
+        with patch('django_libs.utils.converter.convert_html_to_plain_text',
+                   return_value='foo') as convert_mock:
+            self.assertEqual(html_to_plain_text(html), 'foo')
+            self.assertEqual(convert_mock.call_count, 1, msg=(
+                'Should not cache the results by default.'))
+            with self.settings(HTML2PLAINTEXT_CACHE_SIZE=2):
+                for i in range(3):
+                    self.assertEqual(html_to_plain_text(html), 'foo')
+                self.assertEqual(convert_mock.call_count, 2, msg=(
+                    'Should only convert the same html once.'))
+                self.assertEqual(get_html_to_plain_text_cache_info(), {
+                    'hits': 2, 'misses': 1, 'size': 1, 'hit_rate': 2 / 3.0})
+                html_to_plain_text(html.encode('utf-8'))
+                html_to_plain_text('<p>Other</p>')
+                html_to_plain_text(html)
+                self.assertEqual(convert_mock.call_count, 5, msg=(
+                    'Should only cache the given number of results.'))
+                html_to_plain_text(['<p>', 'Chunks</p>'])
+                self.assertEqual(convert_mock.call_count, 6)
+                self.assertEqual(
+                    get_html_to_plain_text_cache_info()['size'], 2, msg=(
+                        'Should not cache chunks.'))
+                with self.settings(HTML2PLAINTEXT_STROKE_TEXT='='):
+                    self.assertEqual(
+                        get_html_to_plain_text_cache_info()['size'], 0, msg=(
+                            'Should clear the cache, if a setting changes.'))
+
+
+class IterHTMLToPlainTextTestCase(TestCase):
+    """Tests for the ``iter_html_to_plain_text`` function."""
+    longMessage = True
+
+    def test_function(self):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            '../test_app/templates/html_email.html')
+        with open(path, 'rb') as file:
+            html = file.read()
+        with open(path, 'rb') as file:
+            result = ''.join(iter_html_to_plain_text(iter(
+                lambda: file.read(7), b'')))
+        self.assertEqual(result, html_to_plain_text(html), msg=(
+            'Should return the same text as html_to_plain_text.'))
+        for html, normalized_html in CORPUS:
+            self.assertEqual(
+                ''.join(iter_html_to_plain_text(html)),
+                html_to_plain_text(html), msg=(
+                    'Should convert {0!r} like html_to_plain_text.'.format(
+                        html)))
+
+    def get_peak_memory(self, count):
+        """Returns the peak memory while converting ``count`` chunks."""
+        chunk = '<p>line<br>more<img src=x></p>' * 100
+        tracemalloc.start()
+        try:
+            for text in iter_html_to_plain_text(
+                    chunk for i in range(count)):
+                pass
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_memory(self):
+        small = self.get_peak_memory(20)
+        large = self.get_peak_memory(200)
+        self.assertLess(large, small * 2, msg=(
+            'Should not need more memory for larger documents full of void'
+            ' elements ({0} vs. {1} bytes).'.format(small, large)))
+
+    def test_streaming(self):
+        fed = []
+
+        def chunks():
+            for i in range(1000):
+                fed.append(i)
+                yield '<tr><td><a href="/{0}/">Row {0}</a></td></tr>'.format(i)
+
+        result = iter_html_to_plain_text(chunks())
+        self.assertTrue(next(result).startswith('---'))
+        self.assertLess(len(fed), 5, msg=(
+            'Should yield the text before all chunks have been converted.'))
+        result = list(result)
+        self.assertEqual(result[-1], '[1000]: /999/\n', msg=(
+            'Should yield the footnotes at the end.'))
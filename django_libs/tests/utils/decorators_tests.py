@@ -1,7 +1,11 @@
 """Tests for the decorator utils of ``django_libs``."""
+import threading
+import time
+
+from django.core.cache import cache
 from django.test import TestCase
 
-from ...utils.decorators import conditional_decorator
+from ...utils.decorators import cached, conditional_decorator
 
 
 def dummy_decorator(func):
@@ -36,3 +40,87 @@ class ConditionalDecoratorTestCase(TestCase):
         result = test_method_true()
         self.assertEqual(result, 0, msg=(
             'The method should have been executed with the decorator'))
+
+
+class CachedTestCase(TestCase):
+    """Tests for the ``cached`` decorator."""
+    longMessage = True
+
+    def setUp(self):
+        cache.clear()
+        self.calls = []
+
+    def compute(self, value):
+        self.calls.append(value)
+        return value * len(self.calls)
+
+    def test_decorator(self):
+        func = cached()(self.compute)
+        self.assertEqual(func(2), 2)
+        self.assertEqual(func(2), 2, msg=('Should return the cached result.'))
+        self.assertEqual(func(value=3), 6, msg=(
+            'Should cache the results for every argument.'))
+        self.assertEqual(func.stats(), {
+            'local': 1, 'shared': 0, 'stale': 0, 'miss': 2,
+            'hit_rate': 1 / 3.0})
+
+        func.invalidate()
+        self.assertEqual(func(2), 6, msg=(
+            'Should compute the result again after an invalidation.'))
+
+    def test_tiers(self):
+        func = cached(maxsize=1, key=lambda value: str(value))(self.compute)
+        func(1)
+        func(2)
+        self.assertEqual(func(1), 1, msg=(
+            'Should get results evicted from the in-process cache from the'
+            ' shared cache.'))
+        self.assertEqual(func.stats()['shared'], 1)
+
+        other_process = cached(key=lambda value: str(value))(self.compute)
+        self.assertEqual(other_process(2), 4, msg=(
+            'Should share the results between processes.'))
+        self.assertEqual(len(self.calls), 2)
+
+    def test_timeout(self):
+        func = cached(timeout=0.1)(self.compute)
+        func(1)
+        time.sleep(0.15)
+        self.assertEqual(func(1), 2, msg=(
+            'Should compute expired results again.'))
+
+    def test_local_timeout(self):
+        func = cached(local_timeout=0.1)(self.compute)
+        other_process = cached()(self.compute)
+        func(1)
+        other_process.invalidate()
+        self.assertEqual(func(1), 1, msg=(
+            'Should serve the in-process copy until local_timeout.'))
+        time.sleep(0.15)
+        self.assertEqual(func(1), 2, msg=(
+            'Should notice invalidations of other processes after'
+            ' local_timeout.'))
+
+    def test_cache(self):
+        cached_function = cached()(self.compute).invalidate.__self__
+        caches = []
+        thread = threading.Thread(
+            target=lambda: caches.append(cached_function.cache))
+        thread.start()
+        thread.join()
+        self.assertIsNot(caches[0], cached_function.cache, msg=(
+            'Should use the cache instance of the current thread.'))
+
+    def test_stale_timeout(self):
+        func = cached(timeout=0.1, stale_timeout=10)(self.compute)
+        func(1)
+        time.sleep(0.15)
+        self.assertEqual(func(1), 1, msg=(
+            'Should serve expired results, while they are refreshed.'))
+        for i in range(50):
+            if len(self.calls) == 2:
+                break
+            time.sleep(0.01)
+        self.assertEqual(func(1), 2, msg=(
+            'Should refresh the result in the background.'))
+        self.assertEqual(func.stats()['stale'], 1)
@@ -1,13 +1,19 @@
 """Tests for the email utils of ``django_libs``."""
-from unittest.mock import Mock
+import smtplib
+import time
+from unittest.mock import Mock, patch
 
 from django.core import mail
+from django.core.mail import get_connection
+from django.template.loader import render_to_string
 from django.test import TestCase
+from django.utils.safestring import mark_safe
 
 from mailer.models import Message
 from mixer.backend.django import mixer
 
-from ...utils.email import send_email
+from ..smtp_sink import SMTPSink
+from ...utils.email import EmailTemplate, send_email, send_mass_email
 
 
 def context_fn(request):
@@ -54,3 +60,217 @@ class SendEmailTestCase(TestCase):
         email = mail.outbox[0]
         self.assertEqual(['cc@example.com'], email.cc)
         self.assertEqual(['bcc@example.com'], email.bcc)
+
+
+TEMPLATES = {
+    'plain.html': (
+        '<p>{{ greeting }} {{ name }}!</p>'
+        '{% autoescape off %}{{ name }}{% endautoescape %}'
+        '{% for item in items %}<li>{{ item }} {{ url }}</li>{% endfor %}'
+        '{% if greeting %}{% with link=greeting %}{{ url }}{% endwith %}'
+        '{% endif %}'
+        '{% for name in items %}{{ name }}{% endfor %}{{ missing }}'),
+    'base.html': (
+        '<h1>{% block title %}{{ greeting }}{% endblock %}</h1>'
+        '{% include "footer.html" %}'),
+    'child.html': (
+        '{% extends "base.html" %}'
+        '{% block title %}{{ block.super }} {{ name }}{% endblock %}'),
+    'footer.html': '<a href="{{ url }}">Unsubscribe {{ name }}</a>',
+    'filter.html': '{{ greeting }} {{ name|upper }}',
+    'condition.html': '{% if name %}{{ greeting }}{% endif %}',
+    'firstof.html': '{% firstof missing name %}',
+    'with.html': '{% with link=url %}{{ link }}{% endwith %}',
+    'tag.html': '{% filter upper %}{{ name }}{% endfilter %}',
+    'attribute.html': '{{ name.upper }}',
+    'include.html': '{% include "footer.html" with url=name %}',
+    'included_filter.html': '{% include "filter.html" %}',
+    'variable_include.html': '{% include template %}',
+}
+
+
+class EmailTemplateTestCase(TestCase):
+    """Tests for the ``EmailTemplate`` class."""
+    longMessage = True
+
+    def setUp(self):
+        self.templates_settings = self.settings(TEMPLATES=[{
+            'BACKEND': 'django.template.backends.django.DjangoTemplates',
+            'OPTIONS': {'loaders': [
+                ('django.template.loaders.locmem.Loader', TEMPLATES)]},
+        }])
+        self.templates_settings.enable()
+        self.context = {
+            'greeting': 'Hello & welcome', 'items': ['a', '<b>'],
+            'template': 'footer.html'}
+
+    def tearDown(self):
+        self.templates_settings.disable()
+
+    def assertRendersLikeTemplate(self, template_name, compiled):
+        template = EmailTemplate(template_name, ['name', 'url'], self.context)
+        self.assertEqual(template.parts is not None, compiled, msg=(
+            'Should only fill in values, if the result stays the same.'))
+        for personal_context in (
+                {'name': 'Jane', 'url': 'https://example.com/?a=1&b=2'},
+                {'name': '<Tom & "Jerry">', 'url': ''},
+                {'name': mark_safe('<b>Joe</b>'), 'url': 'x'},
+                {'name': 42, 'url': None},
+                {'name': 'Jim'}):
+            context = dict(self.context)
+            context.update(personal_context)
+            self.assertEqual(
+                template.render(personal_context),
+                render_to_string(template_name, context), msg=(
+                    'Should return the same as a full render of {0} with'
+                    ' {1}.'.format(template_name, personal_context)))
+
+    def test_compiled(self):
+        for template_name in ('plain.html', 'child.html', 'footer.html'):
+            self.assertRendersLikeTemplate(template_name, True)
+
+    def test_not_compiled(self):
+        for template_name in ('filter.html', 'condition.html', 'firstof.html',
+                              'with.html', 'tag.html', 'attribute.html',
+                              'include.html', 'included_filter.html',
+                              'variable_include.html'):
+            self.assertRendersLikeTemplate(template_name, False)
+
+
+class SendMassEmailTestCase(TestCase):
+    """Tests for the ``send_mass_email`` function."""
+    longMessage = True
+
+    def get_messages(self, count, refused=()):
+        return [
+            ({'name': 'user{0}'.format(i), 'token': i},
+             ['refused{0}@example.com'.format(i) if i in refused
+              else 'user{0}@example.com'.format(i)])
+            for i in range(count)]
+
+    def send(self, sink, messages):
+        connection = get_connection(
+            'django.core.mail.backends.smtp.EmailBackend',
+            host='127.0.0.1', port=sink.port)
+        return send_mass_email(
+            None, messages, 'mass_subject.html', 'mass_email.html',
+            'info@example.com', connection=connection)
+
+    def test_send_mass_email(self):
+        results = send_mass_email(
+            None, self.get_messages(3), 'mass_subject.html',
+            'mass_email.html', 'info@example.com')
+        self.assertEqual(len(mail.outbox), 3, msg=(
+            'Should send one email per message.'))
+        self.assertEqual(mail.outbox[1].to, ['user1@example.com'])
+        self.assertEqual(mail.outbox[1].subject, 'Hello user1')
+        self.assertIn('/unsubscribe/1/', mail.outbox[1].body, msg=(
+            'Should render each email with its own context.'))
+        self.assertEqual(results, [
+            (['user{0}@example.com'.format(i)], None) for i in range(3)])
+
+        mail.outbox = []
+        news = [{'url': '/news/1/', 'title': 'Foo & bar'}]
+        messages = [({'name': 'user{0}'.format(i), 'token': str(i)},
+                     ['user{0}@example.com'.format(i)]) for i in range(3)]
+        with patch.object(EmailTemplate, 'compile', autospec=True,
+                          side_effect=EmailTemplate.compile) as compile_mock:
+            send_mass_email(None, messages, 'mass_subject.html',
+                            'mass_email.html', 'info@example.com',
+                            context={'news': news})
+        self.assertEqual(compile_mock.call_count, 2, msg=(
+            'Should only render the subject and body templates once.'))
+        for context, recipients in messages:
+            context['news'] = news
+            send_email(None, context, 'mass_subject.html', 'mass_email.html',
+                       'info@example.com', recipients)
+        self.assertEqual(
+            [(email.subject, email.body, email.alternatives)
+             for email in mail.outbox[:3]],
+            [(email.subject, email.body, email.alternatives)
+             for email in mail.outbox[3:]], msg=(
+                'Should send the same emails as send_email.'))
+
+        with self.settings(EMAIL_BACKEND='mailer.backend.DbBackend'):
+            send_mass_email(None, self.get_messages(2), 'mass_subject.html',
+                            'mass_email.html', 'info@example.com')
+            self.assertEqual(Message.objects.count(), 2, msg=(
+                'Should queue the emails, if django-mailer is used.'))
+
+    def test_connection_reuse(self):
+        with SMTPSink() as sink:
+            results = self.send(sink, self.get_messages(20))
+        self.assertEqual(len(sink.messages), 20)
+        self.assertEqual(sink.connections, 1, msg=(
+            'Should send all emails over one connection.'))
+        self.assertTrue(all(error is None for recipients, error in results))
+
+    def test_reconnect(self):
+        with SMTPSink(max_messages_per_connection=3) as sink:
+            results = self.send(sink, self.get_messages(10))
+        self.assertEqual(len(sink.messages), 10, msg=(
+            'Should send all emails, if the server drops the connection.'))
+        self.assertEqual(sink.connections, 4)
+        self.assertTrue(all(error is None for recipients, error in results))
+
+    def test_reconnect_failure(self):
+        with SMTPSink(max_messages_per_connection=3) as sink:
+            connection = get_connection(
+                'django.core.mail.backends.smtp.EmailBackend',
+                host='127.0.0.1', port=sink.port)
+            error = ConnectionRefusedError('Connection refused')
+            opened = []
+            open_connection = connection.open
+
+            def open_once():
+                if connection.connection is None:
+                    opened.append(True)
+                    if len(opened) == 2:
+                        raise error
+                return open_connection()
+
+            with patch.object(connection, 'open', side_effect=open_once):
+                results = send_mass_email(
+                    None, self.get_messages(10), 'mass_subject.html',
+                    'mass_email.html', 'info@example.com',
+                    connection=connection)
+        self.assertEqual(len(sink.messages), 3)
+        self.assertEqual(sink.connections, 1, msg=(
+            'Should not open a connection per message, if the connection'
+            ' cannot be opened again.'))
+        self.assertEqual(results[2], (['user2@example.com'], None))
+        self.assertEqual(results[3:], [
+            (['user{0}@example.com'.format(i)], error) for i in range(3, 10)],
+            msg=('Should report all remaining messages as failed.'))
+
+    def test_errors(self):
+        with SMTPSink() as sink:
+            results = self.send(sink, self.get_messages(5, refused=(1, 3)))
+        self.assertEqual(len(sink.messages), 3, msg=(
+            'Should send the other emails, if one is refused.'))
+        self.assertEqual(
+            [error.__class__ for recipients, error in results],
+            [None.__class__, smtplib.SMTPRecipientsRefused, None.__class__,
+             smtplib.SMTPRecipientsRefused, None.__class__])
+        self.assertEqual(results[1][0], ['refused1@example.com'])
+
+    def test_throughput(self):
+        count = 50
+        with SMTPSink() as sink, self.settings(
+                EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                EMAIL_HOST='127.0.0.1', EMAIL_PORT=sink.port):
+            start = time.perf_counter()
+            for context, recipients in self.get_messages(count):
+                send_email(None, context, 'mass_subject.html',
+                           'mass_email.html', 'info@example.com', recipients)
+            single_rate = count / (time.perf_counter() - start)
+            start = time.perf_counter()
+            send_mass_email(None, self.get_messages(count),
+                            'mass_subject.html', 'mass_email.html',
+                            'info@example.com')
+            mass_rate = count / (time.perf_counter() - start)
+        self.assertEqual(len(sink.messages), count * 2)
+        self.assertEqual(sink.connections, count + 1, msg=(
+            'send_email opens a connection per email, send_mass_email only'
+            ' one for all ({0:.0f} vs. {1:.0f} messages per second).'.format(
+                single_rate, mass_rate)))
@@ -0,0 +1,113 @@
+"""Tests for the lock backends of ``django_libs``."""
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils.timezone import now
+
+from ...models import Lock
+from ...utils.locks import (
+    CacheLock,
+    DatabaseLock,
+    FileLock,
+    FlockLock,
+    get_lock_backend,
+)
+
+
+class LockBackendsTestCase(TestCase):
+    longMessage = True
+
+    def setUp(self):
+        cache.clear()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.name = os.path.join(self.tmp_dir, 'command_name')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def acquire_in_thread(self, backend, name):
+        """Returns, if another thread could acquire the lock."""
+        result = []
+
+        def acquire():
+            lock = backend(name)
+            result.append(lock.acquire())
+            if result[0]:
+                lock.release()
+
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        thread.join()
+        return result[0]
+
+    def test_backends(self):
+        other_name = os.path.join(self.tmp_dir, 'other')
+        for backend in (FileLock, FlockLock, CacheLock):
+            lock = backend(self.name)
+            self.assertTrue(lock.acquire(), msg=(
+                'Should acquire the {0}.'.format(backend.__name__)))
+            self.assertFalse(self.acquire_in_thread(backend, self.name), msg=(
+                'Should not acquire the {0} twice.'.format(backend.__name__)))
+            self.assertTrue(self.acquire_in_thread(backend, other_name), msg=(
+                'Should acquire other locks.'))
+            lock.release()
+            self.assertTrue(self.acquire_in_thread(backend, self.name), msg=(
+                'Should release the {0}.'.format(backend.__name__)))
+
+    def test_database_lock(self):
+        # The in-memory test database can't be shared with other threads
+        lock = DatabaseLock(self.name)
+        self.assertTrue(lock.acquire())
+        self.assertFalse(DatabaseLock(self.name).acquire(), msg=(
+            'Should not acquire the lock twice.'))
+        lock.release()
+        lock = DatabaseLock(self.name)
+        self.assertTrue(lock.acquire(), msg=('Should release the lock.'))
+        lock.release()
+
+        lock = DatabaseLock(self.name)
+        lock.acquire()
+        Lock.objects.update(expires=now() - timedelta(seconds=1))
+        other_lock = DatabaseLock(self.name)
+        self.assertTrue(other_lock.acquire(), msg=(
+            'Should take over expired locks of crashed processes.'))
+        self.assertFalse(lock.renew(), msg=(
+            'The first lock should notice, that it has been taken over.'))
+        lock.release()
+        self.assertEqual(Lock.objects.count(), 1, msg=(
+            'Should not release a lock, that has been taken over.'))
+        other_lock.release()
+        self.assertEqual(Lock.objects.count(), 0)
+
+    def test_wait(self):
+        lock = FlockLock(self.name)
+        lock.acquire()
+        start = time.monotonic()
+        self.assertFalse(FlockLock(self.name).acquire(0.2))
+        self.assertGreaterEqual(time.monotonic() - start, 0.2, msg=(
+            'Should wait for the lock until the timeout.'))
+        lock.release()
+
+    def test_cache_lock_heartbeat(self):
+        lock = CacheLock(self.name, ttl=0.3)
+        lock.acquire()
+        time.sleep(0.5)
+        self.assertFalse(CacheLock(self.name).acquire(), msg=(
+            'Should renew the lock while it is held.'))
+        lock.release()
+        self.assertFalse(lock.heartbeat_thread.is_alive(), msg=(
+            'Should stop the heartbeat, when the lock is released.'))
+        self.assertTrue(CacheLock(self.name).acquire())
+
+    def test_get_lock_backend(self):
+        self.assertEqual(get_lock_backend(), FileLock)
+        self.assertEqual(get_lock_backend('cache'), CacheLock)
+        self.assertEqual(get_lock_backend(
+            'django_libs.utils.locks.DatabaseLock'), DatabaseLock)
+        self.assertEqual(get_lock_backend(FlockLock), FlockLock)
@@ -0,0 +1,107 @@
+"""Tests for the rate limiting utils of ``django_libs``."""
+import threading
+from unittest.mock import patch
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import TestCase
+from django.test.client import RequestFactory
+
+from ...middleware import RateLimitMiddleware
+from ...utils.ratelimit import RateLimit, parse_rate
+
+
+class ParseRateTestCase(TestCase):
+    longMessage = True
+
+    def test_function(self):
+        self.assertEqual(parse_rate('100/m'), (100, 60))
+        self.assertEqual(parse_rate('10/5s'), (10, 5))
+        self.assertEqual(parse_rate((10, 30)), (10, 30), msg=(
+            'Should return tuples unchanged.'))
+
+
+class RateLimitTestCase(TestCase):
+    longMessage = True
+
+    def setUp(self):
+        cache.clear()
+        self.request = RequestFactory().get('/')
+        self.request.user = AnonymousUser()
+
+    def test_hit(self):
+        limit = RateLimit('2/m')
+        with patch('django_libs.utils.ratelimit.time.time', return_value=60):
+            self.assertIsNone(limit.hit(self.request))
+            self.assertIsNone(limit.hit(self.request))
+            self.assertEqual(limit.hit(self.request), 60, msg=(
+                'Should return the seconds until the next window.'))
+        with patch('django_libs.utils.ratelimit.time.time', return_value=150):
+            self.assertEqual(limit.hit(self.request), 30, msg=(
+                'Should count the requests of the previous window, too.'))
+        with patch('django_libs.utils.ratelimit.time.time', return_value=185):
+            self.assertIsNone(limit.hit(self.request), msg=(
+                'Should weight the previous window by its remaining overlap.'))
+
+    def test_keys(self):
+        with patch('django_libs.utils.ratelimit.time.time', return_value=60):
+            limit = RateLimit('1/m', key='user')
+            self.assertIsNone(limit.hit(self.request))
+            self.request.user = User.objects.create(username='foo')
+            self.assertIsNone(limit.hit(self.request), msg=(
+                'Should count the requests of a user separately.'))
+            limit = RateLimit('1/m', key=lambda request: 'foo')
+            self.assertIsNone(limit.hit(self.request))
+            self.assertIsNotNone(limit.hit(RequestFactory().get('/')))
+
+    def test_concurrency(self):
+        limit = RateLimit('20/h')
+        results = []
+        barrier = threading.Barrier(50)
+
+        def hit():
+            barrier.wait()
+            results.append(limit.hit(self.request))
+
+        threads = [threading.Thread(target=hit) for i in range(50)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results.count(None), 20, msg=(
+            'Should allow exactly the limit of concurrent requests.'))
+
+    def test_cache(self):
+        limit = RateLimit('1/m', group='^/api/ (foo|bar)\n')
+        self.assertNotIn(' ', limit.get_cache_key(self.request, 1), msg=(
+            'Should hash the group, so it works in memcached keys.'))
+        caches = []
+        thread = threading.Thread(target=lambda: caches.append(limit.cache))
+        thread.start()
+        thread.join()
+        self.assertIsNot(caches[0], limit.cache, msg=(
+            'Should use the cache instance of the current thread.'))
+
+    def test_get_response(self):
+        response = RateLimit('1/m').get_response(12)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '12')
+
+
+class RateLimitMiddlewareTestCase(TestCase):
+    longMessage = True
+
+    def setUp(self):
+        cache.clear()
+
+    def test_middleware(self):
+        with patch('django_libs.default_settings.RATELIMITS',
+                   [(r'^/api/', '1/m', 'ip')]):
+            middleware = RateLimitMiddleware(lambda request: HttpResponse())
+        request = RequestFactory().get('/api/foo/')
+        self.assertEqual(middleware(request).status_code, 200)
+        self.assertEqual(middleware(request).status_code, 429)
+        self.assertEqual(
+            middleware(RequestFactory().get('/foo/')).status_code, 200,
+            msg=('Should not limit other paths.'))
@@ -0,0 +1,83 @@
+"""Tests for the serializer utils of ``django_libs``."""
+import datetime
+import json
+from decimal import Decimal
+from unittest import skipIf
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils.timezone import now
+from django.utils.translation import gettext_lazy
+
+from mixer.backend.django import mixer
+
+from ...utils import serializers
+
+
+class GetSerializerTestCase(TestCase):
+    """Tests for the ``get_serializer`` function."""
+    longMessage = True
+
+    def test_function(self):
+        self.assertEqual(serializers.get_serializer('json'),
+                         serializers.json_dumps)
+        self.assertEqual(
+            serializers.get_serializer('django_libs.utils.serializers.json_dumps'),
+            serializers.json_dumps, msg=('Should load functions by path.'))
+        self.assertEqual(serializers.get_serializer(),
+                         serializers.json_dumps, msg=(
+                             'Should default to the standard library, even'
+                             ' if orjson is installed.'))
+        with patch.object(serializers.default_settings, 'JSON_SERIALIZER',
+                          'django_libs.utils.serializers.orjson_dumps'):
+            self.assertEqual(serializers.get_serializer(),
+                             serializers.orjson_dumps, msg=(
+                                 'Should use the serializer of the setting.'))
+
+
+class GetSeparatorsTestCase(TestCase):
+    """Tests for the ``get_separators`` function."""
+    longMessage = True
+
+    def test_function(self):
+        self.assertEqual(serializers.get_separators(serializers.json_dumps),
+                         (', ', ': '))
+        self.assertEqual(
+            serializers.get_separators(lambda obj: json.dumps(
+                obj, separators=(',', ':'))), (',', ':'), msg=(
+                    'Should return the separators of the serializer.'))
+
+
+class SerializersTestCase(TestCase):
+    """Tests for the serializer functions."""
+    longMessage = True
+
+    def setUp(self):
+        mixer.cycle(2).blend('auth.User')
+        self.payload = {
+            'date': datetime.date(2020, 1, 2),
+            'datetime': now(),
+            'decimal': Decimal('1.50'),
+            'lazy': gettext_lazy('Hello'),
+            1: 'int key',
+            'users': User.objects.order_by('pk'),
+            'user': User.objects.first(),
+        }
+
+    def test_json_dumps(self):
+        result = json.loads(serializers.json_dumps(self.payload))
+        self.assertEqual(result['date'], '2020-01-02')
+        self.assertEqual(result['decimal'], '1.50')
+        self.assertEqual(result['lazy'], 'Hello')
+        self.assertEqual(len(result['users']), 2, msg=(
+            'Should serialize querysets via values().'))
+        self.assertEqual(result['users'][0], result['user'], msg=(
+            'Should serialize model instances like their values().'))
+
+    @skipIf(serializers.orjson is None, 'orjson is not installed.')
+    def test_orjson_dumps(self):
+        self.assertEqual(
+            json.loads(serializers.orjson_dumps(self.payload)),
+            json.loads(serializers.json_dumps(self.payload)),
+            msg=('Should produce the same data as the stdlib serializer.'))
@@ -1,9 +1,31 @@
 """Tests for the view mixins of ``django-libs``."""
+import json
+import tracemalloc
+from datetime import date, datetime
+from unittest.mock import patch
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.http import Http404
+from django.template.base import NodeList
 from django.test import TestCase
 from django.test.client import RequestFactory
-from django.views.generic import TemplateView
+from django.utils import translation
+from django.utils.timezone import now, override, utc
+from django.views.generic import TemplateView, View
 
-from django_libs.views_mixins import AjaxResponseMixin
+from django_libs import views_mixins
+from django_libs.views_mixins import (
+    AjaxResponseMixin,
+    CSVResponseMixin,
+    ConditionalGetMixin,
+    DetailViewWithPostAction,
+    JSONResponseMixin,
+    ListViewWithPostAction,
+    StreamingTemplateResponseMixin,
+)
+from django_libs.utils.serializers import SERIALIZERS
 
 
 class DummyView(AjaxResponseMixin, TemplateView):
@@ -11,6 +33,94 @@ class DummyView(AjaxResponseMixin, TemplateView):
     template_name = "test_template.html"
 
 
+class BlockView(AjaxResponseMixin, TemplateView):
+    """Just a test view."""
+    template_name = 'block_child.html'
+    ajax_block_name = 'content'
+
+    def get_context_data(self, **kwargs):
+        return {'foo': 'bar'}
+
+
+class ListView(TemplateView):
+    """Just a test view."""
+    template_name = 'streaming_list.html'
+
+    def get_context_data(self, **kwargs):
+        return {'users': User.objects.order_by('username'),
+                'pairs': [('ab', 1), ('cd', 2)]}
+
+
+class StreamingListView(StreamingTemplateResponseMixin, ListView):
+    """Just a test view."""
+    streaming_chunk_size = 2
+
+
+class CSVView(CSVResponseMixin, ListView):
+    """Just a test view."""
+    csv_fields = ['username', 'date_joined', 'is_staff', 'last_login']
+    csv_headers = ['Username', 'Joined', 'Staff', 'Last login']
+    csv_filename = 'users.csv'
+    csv_chunk_size = 100
+
+    def get_queryset(self):
+        return User.objects.order_by('pk')
+
+
+class UserDetailView(ConditionalGetMixin, DetailViewWithPostAction):
+    """Just a test view."""
+    model = User
+    template_name = 'base.html'
+    last_modified_field = 'last_login'
+
+    def post_deactivate(self):
+        User.objects.filter(pk=self.object.pk).update(is_active=False)
+
+    def get_success_url(self):
+        return '/'
+
+
+class UserGetObjectView(UserDetailView):
+    """Just a test view."""
+    def get_object(self, queryset=None):
+        return User.objects.get(username=self.kwargs['username'])
+
+
+class UserDateView(UserDetailView):
+    """Just a test view."""
+    def get_conditional_values(self):
+        return self.kwargs['pk'], date(2020, 1, 2)
+
+
+class UserListView(ListViewWithPostAction):
+    """Just a test view."""
+    model = User
+
+    def post_deactivate(self, queryset):
+        queryset.update(is_active=False)
+
+    def post_delete(self, queryset):
+        queryset.delete()
+
+    def post_fail(self, queryset):
+        raise ValueError('Error in the handler')
+
+    def get_success_url_post_delete(self):
+        return '/deleted/'
+
+
+class JSONView(JSONResponseMixin, View):
+    """Just a test view."""
+    json_serializer = 'json'
+
+
+class StreamingJSONView(JSONResponseMixin, View):
+    """Just a test view."""
+    json_serializer = 'json'
+    json_streaming = True
+    json_chunk_size = 100
+
+
 class AjaxResponseMixinTestCase(TestCase):
     longMessage = True
 
@@ -25,3 +135,326 @@ class AjaxResponseMixinTestCase(TestCase):
         self.assertEqual(self.view.get_template_names(),
                          ['ajax_test_template.html'],
                          msg='Got the wrong template name.')
+
+        self.view.template_name = 'base.html'
+        self.assertEqual(self.view.get_template_names(), ['ajax_base.html'])
+        self.view.template_name = 'subject.html'
+        self.assertEqual(self.view.get_template_names(), ['subject.html'],
+                         msg=('Should fall back to the normal template.'))
+
+        with patch.object(views_mixins, 'template_exists') as exists:
+            self.view.get_template_names()
+            self.view.template_name = 'base.html'
+            self.view.get_template_names()
+        self.assertEqual(exists.call_count, 0, msg=(
+            'Should cache the template names per view class and template.'))
+
+        self.view.ajax_template_prefix = 'partials/ajax_'
+        self.view.template_name = 'foo/bar.html'
+        self.assertEqual(self.view.get_template_names(),
+                         ['foo/partials/ajax_bar.html'])
+
+        self.view.request = RequestFactory().get('/')
+        self.assertEqual(self.view.get_template_names(), ['foo/bar.html'])
+
+
+class AjaxResponseMixinBlockTestCase(TestCase):
+    longMessage = True
+
+    def get_content(self, view, ajax=True):
+        extra = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'} if ajax else {}
+        resp = view(RequestFactory().get('/', **extra))
+        return resp.render().content.decode()
+
+    def test_mixin(self):
+        """Test for the ``ajax_block_name`` of the ``AjaxResponseMixin``."""
+        view = BlockView.as_view()
+        self.assertEqual(self.get_content(view), 'Request bar content', msg=(
+            'Should only render the block with the template context.'))
+        self.assertIn('<html>Base title', self.get_content(view, ajax=False),
+                      msg=('Should render the whole page for normal calls.'))
+        self.assertEqual(
+            self.get_content(BlockView.as_view(ajax_block_name='footer')),
+            'bar footer', msg=('Should find blocks of the base template.'))
+
+        with patch.object(NodeList, 'get_nodes_by_type') as get_nodes:
+            self.assertEqual(self.get_content(view), 'Request bar content')
+        self.assertEqual(get_nodes.call_count, 0, msg=(
+            'Should look up the block node only once.'))
+
+        with self.assertRaises(ImproperlyConfigured):
+            self.get_content(BlockView.as_view(ajax_block_name='foo'))
+
+
+class StreamingTemplateResponseMixinTestCase(TestCase):
+    longMessage = True
+
+    def test_mixin(self):
+        """Test for the ``StreamingTemplateResponseMixin`` class."""
+        req = RequestFactory().get('/')
+        resp = StreamingListView.as_view()(req)
+        self.assertTrue(resp.streaming)
+        self.assertEqual(
+            b''.join(resp.streaming_content),
+            ListView.as_view()(req).render().content, msg=(
+                'Should render the same content as the normal template.'))
+
+        User.objects.bulk_create([
+            User(username='user{0}'.format(i)) for i in range(5)])
+        with self.assertNumQueries(0):
+            resp = StreamingListView.as_view()(req)
+            chunks = resp.streaming_content
+            self.assertEqual(next(chunks), b'<html>Header child')
+        chunks = list(chunks)
+        self.assertEqual(len(chunks), 5, msg=(
+            'Should flush after blocks and every two loop iterations.'))
+        self.assertEqual(
+            b''.join(chunks),
+            ListView.as_view()(req).render().content[18:], msg=(
+                'Should render the same content as the normal template.'))
+
+        view = StreamingListView.as_view(
+            streaming_flush_blocks=['content'], streaming_chunk_size=100)
+        self.assertEqual(len(list(view(req).streaming_content)), 2, msg=(
+            'Should only flush after the configured blocks.'))
+
+        class PrefetchView(StreamingListView):
+            def get_context_data(self, **kwargs):
+                return {'users': User.objects.prefetch_related('groups')}
+
+        with self.assertNumQueries(2):
+            b''.join(PrefetchView.as_view()(req).streaming_content)
+
+
+class CSVResponseMixinTestCase(TestCase):
+    longMessage = True
+
+    def get_peak_memory(self, view, req):
+        """Returns the peak memory while streaming the response."""
+        tracemalloc.start()
+        try:
+            for chunk in view(req).streaming_content:
+                pass
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_mixin(self):
+        """Test for the ``CSVResponseMixin`` class."""
+        User.objects.bulk_create([
+            User(username='user{0}'.format(i), is_staff=bool(i % 2),
+                 date_joined=datetime(2020, 1, 2, 12, 0, tzinfo=utc))
+            for i in range(250)])
+        req = RequestFactory().get('/')
+        resp = CSVView.as_view()(req)
+        self.assertEqual(resp['Content-Type'], 'text/csv')
+        self.assertEqual(resp['Content-Disposition'],
+                         'attachment; filename="users.csv"')
+        chunks = list(resp.streaming_content)
+        self.assertEqual(len(chunks), 3, msg=(
+            'Should yield the rows in chunks.'))
+        lines = b''.join(chunks).decode().splitlines()
+        self.assertEqual(len(lines), 251)
+        self.assertEqual(lines[0], 'Username,Joined,Staff,Last login')
+        self.assertEqual(lines[1], 'user0,01/02/2020 6 a.m.,False,')
+
+        with translation.override('de'):
+            resp = CSVView.as_view(csv_delimiter='\t')(req)
+            self.assertEqual(
+                b''.join(resp.streaming_content).decode().splitlines()[2],
+                'user1\t02.01.2020 06:00\tTrue\t')
+
+        peak = self.get_peak_memory(CSVView.as_view(), req)
+        User.objects.bulk_create([
+            User(username='other{0}'.format(i)) for i in range(2250)])
+        self.assertLess(
+            self.get_peak_memory(CSVView.as_view(), req), peak * 2, msg=(
+                'The memory usage should not grow with the number of rows.'))
+
+        with self.assertRaises(ImproperlyConfigured):
+            list(CSVView.as_view(csv_fields=None)(req).streaming_content)
+
+
+class ConditionalGetMixinTestCase(TestCase):
+    longMessage = True
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(
+            username='foo', last_login=datetime(2020, 1, 2, tzinfo=utc))
+        self.pk = self.user.pk
+        self.view = UserDetailView.as_view()
+
+    def get(self, **extra):
+        req = RequestFactory().get('/', **extra)
+        req.user = AnonymousUser()
+        return self.view(req, pk=self.pk)
+
+    def test_mixin(self):
+        """Test for the ``ConditionalGetMixin`` class."""
+        resp = self.get()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Last-Modified'],
+                         'Thu, 02 Jan 2020 00:00:00 GMT')
+        etag = resp['ETag']
+        with self.assertNumQueries(1):
+            resp = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304, msg=(
+            'Should only run one query, if the client is up to date.'))
+        resp = self.get(HTTP_IF_MODIFIED_SINCE=resp['Last-Modified'])
+        self.assertEqual(resp.status_code, 304)
+        with translation.override('de'):
+            self.assertEqual(
+                self.get(HTTP_IF_NONE_MATCH=etag).status_code, 200, msg=(
+                    'Should change the ETag with the language.'))
+
+        req = RequestFactory().post('/', data={'post_deactivate': 1})
+        req.user = AnonymousUser()
+        self.assertEqual(self.view(req, pk=self.user.pk).status_code, 302)
+        resp = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200, msg=(
+            'Post actions should invalidate the ETag.'))
+        self.assertNotEqual(resp['ETag'], etag)
+
+        User.objects.filter(pk=self.user.pk).update(last_login=now())
+        self.assertEqual(
+            self.get(HTTP_IF_NONE_MATCH=resp['ETag']).status_code, 200,
+            msg=('Changes of the object should invalidate the ETag.'))
+
+        self.user.delete()
+        with self.assertRaises(Http404):
+            self.get()
+
+    def test_get_object(self):
+        req = RequestFactory().get('/')
+        req.user = AnonymousUser()
+        resp = UserGetObjectView.as_view()(req, username='foo')
+        self.assertEqual(resp['Last-Modified'],
+                         'Thu, 02 Jan 2020 00:00:00 GMT', msg=(
+                             'Should use the overridden get_object.'))
+
+    def test_date(self):
+        req = RequestFactory().get('/')
+        req.user = AnonymousUser()
+        with override(utc):
+            resp = UserDateView.as_view()(req, pk=self.pk)
+        self.assertEqual(resp['Last-Modified'],
+                         'Thu, 02 Jan 2020 00:00:00 GMT', msg=(
+                             'Should handle dates at midnight in the current'
+                             ' time zone.'))
+
+
+class ListViewWithPostActionTestCase(TestCase):
+    longMessage = True
+
+    def setUp(self):
+        self.users = [User.objects.create(username=name)
+                      for name in ('foo', 'bar', 'baz')]
+        self.view = UserListView.as_view()
+
+    def post(self, data):
+        req = RequestFactory().post('/users/?page=2', data=data)
+        req.user = AnonymousUser()
+        return self.view(req)
+
+    def test_get_post_actions(self):
+        self.assertEqual(
+            UserListView.get_post_actions(),
+            ('post_deactivate', 'post_delete', 'post_fail'),
+            msg=('Should return all action handlers of the class.'))
+        self.assertIn('_post_action_names', UserListView.__dict__, msg=(
+            'Should store the action handlers on the class.'))
+        self.assertEqual(ListViewWithPostAction.get_post_actions(), (), msg=(
+            'Should not share the action handlers between classes.'))
+
+    def test_post(self):
+        selected = [self.users[0].pk, self.users[1].pk]
+        with self.assertNumQueries(1):
+            resp = self.post({'post_deactivate': 1, 'selected': selected})
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(resp['Location'], '/users/?page=2', msg=(
+            'Should redirect to the current page by default.'))
+        self.assertEqual(
+            User.objects.filter(is_active=False).count(), 2, msg=(
+                'Should call the handler with the selected objects.'))
+
+        resp = self.post({'post_delete': 1, 'selected': [self.users[2].pk]})
+        self.assertEqual(resp['Location'], '/deleted/', msg=(
+            'Should use the success url of the action.'))
+        self.assertEqual(User.objects.count(), 2)
+
+        self.assertEqual(self.post({'post_foo': 1}).status_code, 400, msg=(
+            'Should return 400, if no action handler has been posted.'))
+        resp = self.post({'post_delete': 1, 'selected': ['foo']})
+        self.assertEqual(resp.status_code, 400, msg=(
+            'Should return 400, if invalid primary keys have been posted.'))
+        self.assertEqual(User.objects.count(), 2)
+        self.assertRaises(ValueError, self.post, {
+            'post_fail': 1, 'selected': [self.users[0].pk]})
+
+
+class JSONResponseMixinTestCase(TestCase):
+    longMessage = True
+
+    def test_mixin(self):
+        """Test for the ``JSONResponseMixin`` class."""
+        view = JSONView()
+        resp = view.render_to_response({'date': date(2020, 1, 2)})
+        self.assertEqual(resp['Content-Type'], 'application/json')
+        self.assertEqual(resp.content, b'{"date": "2020-01-02"}', msg=(
+            'Should serialize dates with the configured serializer.'))
+
+    def get_peak_memory(self, view, context):
+        """Returns the peak memory while streaming the response."""
+        tracemalloc.start()
+        try:
+            for chunk in view.render_to_response(context):
+                pass
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_streaming(self):
+        User.objects.bulk_create([
+            User(username='user{0}'.format(i)) for i in range(250)])
+        context = {'date': date(2020, 1, 2), 'users': User.objects.all()}
+        view = StreamingJSONView()
+        resp = view.render_to_response(context)
+        self.assertTrue(resp.streaming)
+        content = b''.join(resp.streaming_content)
+        self.assertEqual(content, JSONView().render_to_response(
+            context).content, msg=(
+                'Should stream the same content, that is rendered normally.'))
+        self.assertEqual(len(json.loads(content.decode())['users']), 250)
+        for name in SERIALIZERS:
+            self.assertEqual(
+                b''.join(StreamingJSONView(
+                    json_serializer=name, json_chunk_size=100,
+                ).render_to_response(context).streaming_content),
+                JSONView(json_serializer=name).render_to_response(
+                    context).content, msg=(
+                        'Should use the separators of the {0} serializer.'
+                        .format(name)))
+        self.assertEqual(
+            b''.join(view.render_to_response(
+                User.objects.none()).streaming_content), b'[]')
+        self.assertEqual(
+            b''.join(view.render_to_response([1]).streaming_content), b'[1]')
+
+        class OverridingView(StreamingJSONView):
+            def convert_context_to_json(self, context):
+                return '{}'
+
+        self.assertRaises(ImproperlyConfigured,
+                          OverridingView().render_to_response, context)
+
+        peak = self.get_peak_memory(view, context)
+        User.objects.bulk_create([
+            User(username='other{0}'.format(i)) for i in range(2250)])
+        self.assertEqual(User.objects.count(), 2500)
+        self.assertLess(
+            self.get_peak_memory(view, context), peak * 2, msg=(
+                'The memory usage should not grow with the number of rows.'))
+        self.assertGreater(
+            self.get_peak_memory(JSONView(), context), peak * 4, msg=(
+                'The non-streaming response should use more memory.'))
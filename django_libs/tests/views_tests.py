@@ -1,10 +1,261 @@
 """Tests for the view classes of ``django-libs``."""
+import json
+from unittest.mock import patch
+
+from django.apps import apps
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sessions.backends.cache import SessionStore
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template import TemplateSyntaxError
 from django.test import TestCase
+from django.test.client import RequestFactory
+from django.utils import translation
+from django.utils.cache import patch_vary_headers
+
+from django_comments.models import Comment
+from mixer.backend.django import mixer
 
 from .. import views
 from .mixins import ViewRequestFactoryTestMixin
 
 
+class HybridViewTestCase(ViewRequestFactoryTestMixin, TestCase):
+    """Tests for the ``HybridView`` view class."""
+    longMessage = True
+
+    def setUp(self):
+        cache.clear()
+        self.calls = []
+        self.view = views.HybridView.as_view(
+            authed_view=self.authed_view,
+            anonymous_view=self.anonymous_view,
+            anonymous_cache_timeout=60)
+
+    def authed_view(self, request):
+        self.calls.append('authed')
+        return HttpResponse('authed')
+
+    def anonymous_view(self, request):
+        self.calls.append('anonymous')
+        response = HttpResponse('anonymous')
+        if request.GET.get('cookie'):
+            response.set_cookie('foo', 'bar')
+        if request.GET.get('session'):
+            response.content = request.session.get('foo', '')
+        if request.GET.get('encoding'):
+            response.content = request.META.get('HTTP_ACCEPT_ENCODING', '')
+            patch_vary_headers(response, ('Accept-Encoding', ))
+        return response
+
+    def test_view(self):
+        resp = self.is_callable(data={'b': 1, 'a': 2})
+        self.assertEqual(resp.content, b'anonymous')
+        self.assertEqual(resp['Vary'], 'Cookie')
+        resp = self.is_callable(data={'a': 2, 'b': 1})
+        self.assertEqual(resp.content, b'anonymous')
+        self.assertEqual(self.calls, ['anonymous'], msg=(
+            'Should serve the second response from the cache.'))
+
+        self.is_callable(data={'a': 1})
+        self.assertEqual(len(self.calls), 2, msg=(
+            'Should cache responses per query string.'))
+
+        self.is_callable(data={'cookie': 1})
+        self.is_callable(data={'cookie': 1})
+        self.assertEqual(len(self.calls), 4, msg=(
+            'Should not cache responses that set cookies.'))
+
+        for encoding in ('br', 'gzip', 'gzip'):
+            resp = self.view(self.get_get_request(
+                data={'encoding': 1}, HTTP_ACCEPT_ENCODING=encoding))
+        self.assertEqual(resp.content, b'gzip', msg=(
+            'Should cache responses per value of the headers in Vary.'))
+        self.assertEqual(len(self.calls), 6)
+
+        self.view(self.get_request(RequestFactory().head, data={'a': 1}))
+        self.assertEqual(len(self.calls), 7, msg=(
+            'Should cache responses per method.'))
+
+        for data in ({'session': 1}, {'session': 1}, {}, {}):
+            req = RequestFactory().get('/', data=data)
+            req.user = AnonymousUser()
+            req.session = SessionStore()
+            # E.g. the authentication middleware reads the session
+            req.session.get('foo')
+            self.view(req)
+            self.assertTrue(req.session.accessed, msg=(
+                'Should keep the accessed flag of the session.'))
+        self.assertEqual(len(self.calls), 10, msg=(
+            'Should only cache responses, that don\'t depend on the'
+            ' session.'))
+
+        for value in (1, 2, 3):
+            resp = self.view(self.get_get_request(
+                data={'ga': 1}, HTTP_COOKIE='_ga={0}'.format(value)))
+        self.assertEqual(len(self.calls), 11, msg=(
+            'Should share the response between visitors with other cookies.'))
+        self.assertEqual(resp['Vary'], 'Cookie', msg=(
+            'Should still send Vary: Cookie downstream.'))
+
+        resp = self.is_callable(user=mixer.blend('auth.User'))
+        self.assertEqual(resp.content, b'authed')
+        self.is_callable(user=mixer.blend('auth.User'))
+        self.assertEqual(self.calls[-2:], ['authed', 'authed'], msg=(
+            'Should never cache responses for authenticated users.'))
+
+
+class PaginatedCommentAJAXViewTestCase(ViewRequestFactoryTestMixin,
+                                       TestCase):
+    """Tests for the ``PaginatedCommentAJAXView`` view class."""
+    longMessage = True
+
+    def setUp(self):
+        cache.clear()
+        self.view_class = views.PaginatedCommentAJAXView
+        self.user = mixer.blend('auth.User')
+        self.data = {'ctype': 'auth.user', 'object_pk': self.user.pk}
+
+    def get_view_name(self):
+        return 'comments'
+
+    @patch.object(views.PaginatedCommentAJAXView, 'render_content',
+                  return_value='{"data": "foo"}')
+    def test_view(self, render_content):
+        self.is_not_callable()
+        resp = self.is_callable(ajax=True, data=self.data)
+        self.assertEqual(resp.content, b'{"data": "foo"}')
+        self.is_callable(ajax=True, data=self.data)
+        self.assertEqual(render_content.call_count, 1, msg=(
+            'The second request should have been served from the cache.'))
+
+        req = self.get_get_request(ajax=True, data=self.data,
+                                   HTTP_IF_NONE_MATCH=resp['ETag'])
+        resp = self.get_view()(req)
+        self.assertEqual(resp.status_code, 304, msg=(
+            'Should return 304 if the client is up to date.'))
+
+        comment = mixer.blend(
+            Comment, content_object=self.user, site=mixer.SELECT)
+        self.is_callable(ajax=True, data=self.data)
+        self.assertEqual(render_content.call_count, 2, msg=(
+            'Saving a comment should invalidate the cached pages.'))
+        comment.delete()
+        self.is_callable(ajax=True, data=self.data)
+        self.assertEqual(render_content.call_count, 3, msg=(
+            'Deleting a comment should invalidate the cached pages.'))
+
+        self.is_callable(ajax=True, data={
+            'ctype': 'auth.user', 'object_pk': mixer.blend(User).pk})
+        self.assertEqual(render_content.call_count, 4, msg=(
+            'Should cache the pages per object.'))
+
+        with translation.override('de'):
+            self.is_callable(ajax=True, data=self.data)
+        self.assertEqual(render_content.call_count, 5, msg=(
+            'Should cache the pages per language.'))
+
+        with patch.object(views.default_settings, 'COMMENTS_CACHE_TIMEOUT',
+                          0):
+            self.is_callable(ajax=True, data=self.data)
+        self.assertEqual(render_content.call_count, 6, msg=(
+            'Should not use the cache if it has been disabled.'))
+
+    @patch.object(views.default_settings, 'COMMENTS_CACHE_TIMEOUT', 0)
+    def test_rendering(self):
+        resp = self.is_callable(ajax=True, data=self.data)
+        self.assertIn(b'No comments so far', resp.content)
+
+        mixer.cycle(3).blend(Comment, content_object=self.user,
+                             site=mixer.SELECT, user=mixer.SELECT)
+        with self.assertNumQueries(2):
+            resp = self.is_callable(ajax=True, data=self.data)
+        mixer.cycle(7).blend(Comment, content_object=self.user,
+                             site=mixer.SELECT, user=mixer.SELECT)
+        with self.assertNumQueries(2):
+            resp = self.is_callable(ajax=True, data=self.data)
+        self.assertEqual(resp.content.count(b'class=\\"comment_header'), 10,
+                         msg=('Should render a whole page of comments.'))
+
+        comment = Comment.objects.last()
+        data = self.data.copy()
+        data.update({'comment_pk': comment.pk, 'page': 1})
+        mixer.blend(Comment, content_object=self.user, site=mixer.SELECT)
+        resp = self.is_callable(ajax=True, data=data)
+        self.assertIn('"page": 1', resp.content.decode(), msg=(
+            'Should jump to the page of the requested comment.'))
+        self.is_callable(ajax=True, data={'ctype': 'foo', 'object_pk': 1})
+        self.is_callable(ajax=True, data={'ctype': 'foo.bar', 'object_pk': 1})
+
+    @patch.object(views.default_settings, 'COMMENTS_CACHE_TIMEOUT', 0)
+    def test_content_type(self):
+        content_type = ContentType.objects.create(
+            app_label='test_app', model='user')
+        mixer.blend(Comment, content_type=content_type,
+                    object_pk=self.user.pk, site=mixer.SELECT)
+        resp = self.is_callable(ajax=True, data={
+            'ctype': 'auth.User', 'object_pk': self.user.pk})
+        self.assertIn(b'No comments so far', resp.content, msg=(
+            'Should not match models of the same name in other apps.'))
+        resp = self.is_callable(ajax=True, data={
+            'ctype': 'test_app.user', 'object_pk': self.user.pk})
+        self.assertNotIn(b'No comments so far', resp.content)
+
+
+class PrerenderedErrorViewsTestCase(ViewRequestFactoryTestMixin,
+                                    TestCase):
+    """Tests for the ``PrerenderedHttp404View`` and ``...500View`` classes."""
+    longMessage = True
+
+    def setUp(self):
+        views._error_pages.clear()
+        self.view = views.page_not_found
+
+    def test_view(self):
+        with patch.object(views.default_settings, 'PRERENDER_ERROR_PAGES',
+                          True):
+            apps.get_app_config('django_libs').ready()
+        self.assertEqual(sorted(views._error_pages), ['404.html', '500.html'],
+                         msg=('Should render the pages at startup.'))
+        with self.assertNumQueries(0):
+            resp = self.view(self.get_get_request(), exception=Exception())
+        self.assertEqual(resp.status_code, 404)
+        self.assertEqual(resp.content, b'Page not found.\n')
+        resp = views.server_error(self.get_get_request())
+        self.assertEqual(resp.status_code, 500)
+        self.assertEqual(resp.content, b'Server error.\n')
+
+        with patch.object(views, 'render_error_page') as render_error_page:
+            self.view(self.get_get_request())
+            content, path, mtime = views._error_pages['404.html']
+            views._error_pages['404.html'] = (content, path, 0)
+            self.view(self.get_get_request())
+            self.assertEqual(render_error_page.call_count, 0, msg=(
+                'Should not render the page again, if DEBUG is False.'))
+            with self.settings(DEBUG=True):
+                self.view(self.get_get_request())
+            self.assertEqual(render_error_page.call_count, 1, msg=(
+                'Should render the page again, if the template has changed.'))
+
+        with patch.object(views.PrerenderedHttp404View, 'template_name',
+                          'foo.html'):
+            resp = self.view(self.get_get_request())
+        self.assertIn(b'Not Found', resp.content, msg=(
+            'Should serve a fallback, if the template does not exist.'))
+
+        views._error_pages.clear()
+        with patch.object(views, 'render_error_page',
+                          side_effect=TemplateSyntaxError('foo')):
+            views.prerender_error_pages()
+            resp = views.server_error(self.get_get_request())
+            self.assertEqual(resp.status_code, 500)
+            self.assertIn(b'Server Error', resp.content, msg=(
+                'Should serve a fallback, if the page can\'t be rendered.'))
+            self.assertRaises(TemplateSyntaxError, self.view,
+                              self.get_get_request())
+
+
 class RapidPrototypingViewTestCase(ViewRequestFactoryTestMixin, TestCase):
     """Tests for the ``RapidPrototypingView`` view class."""
     longMessage = True
@@ -54,3 +305,48 @@ class UpdateCookieAJAXViewTestCase(ViewRequestFactoryTestMixin, TestCase):
         data = {'cookie_key': 'foo', 'cookie_value': 'bar'}
         resp = self.is_postable(ajax=True, data=data)
         self.assertEqual(resp.content, b'done')
+
+
+class UpdateSessionAndCookiesAJAXViewTestCase(ViewRequestFactoryTestMixin,
+                                              TestCase):
+    """Tests for the ``UpdateSessionAndCookiesAJAXView`` view class."""
+    longMessage = True
+
+    def setUp(self):
+        self.view_class = views.UpdateSessionAndCookiesAJAXView
+
+    def get_view_name(self):
+        return 'update_session_and_cookies'
+
+    def test_view(self):
+        self.is_forbidden()
+        data = {'session[foo]': 'bar', 'session[baz]': 'qux',
+                'cookies[spam]': 'eggs', 'cookie_days': 2}
+        req = self.get_post_request(ajax=True, data=data, add_session=True)
+        resp = self.get_view()(req)
+        self.assertEqual(resp.content, b'done')
+        self.assertEqual(req.session['foo'], 'bar')
+        self.assertEqual(req.session['baz'], 'qux')
+        self.assertEqual(resp.cookies['spam'].value, 'eggs')
+        self.assertEqual(resp.cookies['spam']['max-age'], 2 * 24 * 60 * 60)
+        self.assertTrue(req.session.modified)
+
+        req = self.get_post_request(
+            ajax=True, add_session=True,
+            data=json.dumps({'session': {'foo': 'bar'}, 'cookies': {'a': 1}}),
+            content_type='application/json',
+            session_dict={'foo': 'bar'})
+        req.session.modified = False
+        resp = self.get_view()(req)
+        self.assertFalse(req.session.modified, msg=(
+            'Should not save the session, if no value has changed.'))
+        self.assertEqual(resp.cookies['a'].value, '1')
+
+        for body in ('[]', '{"cookie_days": null}', '{"cookie_days": [1]}',
+                     '{"cookie_days": "7"}', '{"cookie_days": 1.5}'):
+            req = self.get_post_request(
+                ajax=True, data=body, content_type='application/json')
+            self.assertEqual(self.get_view()(req).status_code, 400, msg=(
+                'Should reject invalid data like {0}.'.format(body)))
+        req = self.get_post_request(ajax=True, data={'cookie_days': 'x'})
+        self.assertEqual(self.get_view()(req).status_code, 400)
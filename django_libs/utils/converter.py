@@ -1,7 +1,12 @@
 """Additional helpful utility functions."""
-import sys
+import codecs
+import hashlib
+import threading
+from collections import Counter, OrderedDict
 
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 
 try:
     from django.utils import six
@@ -16,11 +21,18 @@ except ImportError:
 try:
     from bs4 import BeautifulSoup
 except ImportError:  # pragma: nocover
-    sys.stderr.write('Warning: BeautifulSoup could not be imported! Created'
-                     ' fallback for tests to work.')
+    BeautifulSoup = None
 
-    def BeautifulSoup(x, y):
-        return x
+
+# Elements, that can't have any content. BeautifulSoup closes them right away.
+VOID_ELEMENTS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen',
+    'link', 'menuitem', 'meta', 'param', 'source', 'track', 'wbr', 'basefont',
+    'bgsound', 'command', 'frame', 'image', 'isindex', 'nextid', 'spacer',
+])
+# Elements, in which BeautifulSoup doesn't collapse whitespace
+PRESERVE_WHITESPACE_ELEMENTS = frozenset(['pre', 'textarea'])
+ASCII_SPACES = ' \n\t\x0c\r'
 
 
 class HTML2PlainParser(HTMLParser):
@@ -30,42 +42,115 @@ class HTML2PlainParser(HTMLParser):
             super(HTML2PlainParser, self).__init__()
         except TypeError:
             self.reset()
-        self.text = ''  # Used to push the results into a variable
+        # The results are collected in a list and joined at the end. The tail
+        # holds the last characters of the text for the ``endswith`` checks.
+        self.parts = []
+        self.tail = ''
         self.links = []  # List of aggregated links
 
         # Settings
-        self.ignored_elements = getattr(
+        self.ignored_elements = frozenset(getattr(
             settings, 'HTML2PLAINTEXT_IGNORED_ELEMENTS',
             ['html', 'head', 'style', 'meta', 'title', 'img']
-        )
-        self.newline_before_elements = getattr(
+        ))
+        self.newline_before_elements = frozenset(getattr(
             settings, 'HTML2PLAINTEXT_NEWLINE_BEFORE_ELEMENTS',
             ['br', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'div', 'p', 'li']
-        )
-        self.newline_after_elements = getattr(
+        ))
+        self.newline_after_elements = frozenset(getattr(
             settings, 'HTML2PLAINTEXT_NEWLINE_AFTER_ELEMENTS',
             ['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'div', 'p', 'td']
-        )
-        self.stroke_before_elements = getattr(
+        ))
+        self.stroke_before_elements = frozenset(getattr(
             settings, 'HTML2PLAINTEXT_STROKE_BEFORE_ELEMENTS',
             ['tr']
-        )
-        self.stroke_after_elements = getattr(
+        ))
+        self.stroke_after_elements = frozenset(getattr(
             settings, 'HTML2PLAINTEXT_STROKE_AFTER_ELEMENTS',
             ['tr']
-        )
+        ))
         self.stroke_text = getattr(settings, 'HTML2PLAINTEXT_STROKE_TEXT',
                                    '------------------------------\n')
+        self.tail_length = max(len(self.stroke_text), 1)
+
+    @property
+    def text(self):
+        """Returns the plain text, that has been converted so far."""
+        if len(self.parts) > 1:
+            self.parts = [''.join(self.parts)]
+        return self.parts[0] if self.parts else ''
+
+    @text.setter
+    def text(self, value):
+        self.parts = [value] if value else []
+        self.tail = value[-self.tail_length:]
+
+    def write(self, text):
+        """Appends text to the result."""
+        if text:
+            self.parts.append(text)
+            self.tail = (self.tail + text)[-self.tail_length:]
+
+    def pop_final_text(self):
+        """
+        Removes and returns the text, that can't change anymore.
+
+        The end of the text is kept, because strokes might still be removed
+        from it and trailing whitespace is stripped from the result.
+
+        """
+        if not self.stroke_text:
+            # Removing an empty stroke removes the whole text
+            return ''
+        text = self.text
+        stroke = self.stroke_text
+        # Several strokes in a row might be removed, the first one maybe
+        # together with text, that hasn't been added yet
+        end = len(text)
+        for prefix_length in range(len(stroke)):
+            if text.endswith(stroke[:prefix_length]):
+                stroke_end = len(text) - prefix_length
+                while text.endswith(stroke, 0, stroke_end):
+                    stroke_end -= len(stroke)
+                end = min(end, stroke_end)
+        # Whitespace in front of the strokes might end up at the end. Also
+        # keep enough text for the ``endswith`` checks after a removal.
+        end = len(text[:end].rstrip()) - self.tail_length
+        if end <= 0:
+            return ''
+        self.parts = [text[end:]]
+        return text[:end]
+
+    def remove_stroke(self):
+        """Removes the stroke at the end of the result."""
+        length = len(self.stroke_text)
+        if not length:
+            # Behaves like slicing the text with ``[:-0]``
+            self.parts = []
+        while length:
+            part = self.parts.pop()
+            if len(part) > length:
+                self.parts.append(part[:-length])
+                break
+            length -= len(part)
+        tail = []
+        tail_size = 0
+        for part in reversed(self.parts):
+            tail.append(part)
+            tail_size += len(part)
+            if tail_size >= self.tail_length:
+                break
+        self.tail = ''.join(reversed(tail))[-self.tail_length:]
 
     def handle_starttag(self, tag, attrs):
         """Handles every start tag like e.g. <p>."""
         if (tag in self.newline_before_elements):
-            self.text += '\n'
+            self.write('\n')
         if (tag in self.stroke_before_elements and not
-                self.text.endswith(self.stroke_text)):
+                self.tail.endswith(self.stroke_text)):
             # Put a stroke in front of every relevant element, if there is some
             # content between it and its predecessor
-            self.text += self.stroke_text
+            self.write(self.stroke_text)
         if tag == 'a':
             # If it's a link, append it to the link list
             for attr in attrs:
@@ -82,55 +167,281 @@ class HTML2PlainParser(HTMLParser):
             if text:
                 if self.lasttag == 'li':
                     # Use a special prefix for list elements
-                    self.text += '  * '
-                self.text += text
+                    self.write('  * ')
+                self.write(text)
                 if self.lasttag in self.newline_after_elements:
                     # Add a linebreak at the end of the content
-                    self.text += '\n'
+                    self.write('\n')
 
     def handle_endtag(self, tag):
         """Handles every end tag like e.g. </p>."""
         if tag in self.stroke_after_elements:
-            if self.text.endswith(self.stroke_text):
+            if self.tail.endswith(self.stroke_text):
                 # Only add a stroke if there isn't already a stroke posted
                 # In this case, there was no content between the tags, so
                 # remove the starting stroke
-                self.text = self.text[:-len(self.stroke_text)]
+                self.remove_stroke()
             else:
                 # If there's no linebreak before the stroke, add one!
-                if not self.text.endswith('\n'):
-                    self.text += '\n'
-                self.text += self.stroke_text
+                if not self.tail.endswith('\n'):
+                    self.write('\n')
+                self.write(self.stroke_text)
         if tag == 'a':
             # If it's a link, add a footnote
-            self.text += '[{}]'.format(len(self.links))
-        elif tag == 'br' and self.text and not self.text.endswith('\n'):
+            self.write('[{}]'.format(len(self.links)))
+        elif tag == 'br' and self.parts and not self.tail.endswith('\n'):
             # If it's a break, check if there's no break at the end of the
             # content. If there's none, add one!
-            self.text += '\n'
+            self.write('\n')
         # Reset the lasttag, otherwise this parse can geht confused, if the
         # next element is not wrapped in a new tag.
         if tag == self.lasttag:
             self.lasttag = None
 
 
+class TolerantHTML2PlainParser(HTML2PlainParser):
+    """
+    Converts malformed html code without normalizing it first.
+
+    Unclosed and stray tags and whitespace between tags are handled like
+    BeautifulSoup's ``html.parser`` tree builder does, so the result is the
+    same as with html, that has been normalized by BeautifulSoup. Call
+    ``close()`` after feeding the last chunk.
+
+    """
+    def reset(self):
+        super(TolerantHTML2PlainParser, self).reset()
+        self.open_elements = []
+        self.open_element_counts = Counter()
+        self.preserve_whitespace = 0
+        # BeautifulSoup creates a string for every text between two tags and
+        # collapses the ones, that contain nothing but whitespace. After
+        # normalizing, strings are only separated by tags, that are kept.
+        self.segment = []
+        self.segments = []
+        self.data_lasttag = None
+
+    def end_segment(self):
+        if self.segment:
+            data = ''.join(self.segment)
+            self.segment = []
+            if not self.preserve_whitespace and not data.strip(ASCII_SPACES):
+                data = '\n' if '\n' in data else ' '
+            self.segments.append(data)
+
+    def flush(self):
+        """Converts the text, that has been collected so far."""
+        self.end_segment()
+        if self.segments:
+            data = ''.join(self.segments)
+            self.segments = []
+            # The text belongs to the tag, that preceded it
+            lasttag = self.lasttag
+            self.lasttag = self.data_lasttag
+            super(TolerantHTML2PlainParser, self).handle_data(data)
+            self.lasttag = lasttag
+
+    def start_element(self, tag, attrs, close_void_element=True):
+        self.flush()
+        super(TolerantHTML2PlainParser, self).handle_starttag(tag, attrs)
+        self.open_elements.append(tag)
+        self.open_element_counts[tag] += 1
+        if tag in PRESERVE_WHITESPACE_ELEMENTS:
+            self.preserve_whitespace += 1
+        if close_void_element and tag in VOID_ELEMENTS:
+            # Its end tag, if there is one, is a stray end tag then
+            self.end_element(tag)
+
+    def end_element(self, tag):
+        """Closes the element and all unclosed elements in it."""
+        self.end_segment()
+        if not self.open_element_counts[tag]:
+            # Stray end tags are ignored
+            return
+        self.flush()
+        while True:
+            name = self.open_elements.pop()
+            self.open_element_counts[name] -= 1
+            if name in PRESERVE_WHITESPACE_ELEMENTS:
+                self.preserve_whitespace -= 1
+            super(TolerantHTML2PlainParser, self).handle_endtag(name)
+            if name == tag:
+                break
+
+    def handle_starttag(self, tag, attrs):
+        self.start_element(tag, attrs)
+
+    def handle_startendtag(self, tag, attrs):
+        self.start_element(tag, attrs, close_void_element=False)
+        self.end_element(tag)
+
+    def handle_endtag(self, tag):
+        self.end_element(tag)
+
+    def handle_data(self, data):
+        if not self.segment and not self.segments:
+            self.data_lasttag = self.lasttag
+        self.segment.append(data)
+
+    def handle_comment(self, data):
+        self.flush()
+
+    def handle_decl(self, decl):
+        self.flush()
+
+    def handle_pi(self, data):
+        self.flush()
+
+    def unknown_decl(self, data):
+        self.flush()
+
+    def close(self):
+        super(TolerantHTML2PlainParser, self).close()
+        self.flush()
+        while self.open_elements:
+            self.end_element(self.open_elements[-1])
+
+
+# Results of ``html_to_plain_text`` by a digest of the html code
+_plain_texts = OrderedDict()
+_plain_texts_lock = threading.Lock()
+_plain_text_stats = {'hits': 0, 'misses': 0}
+
+
+def get_html_to_plain_text_cache_info():
+    """Returns the hits, misses and the hit rate of the plain text cache."""
+    with _plain_texts_lock:
+        info = dict(_plain_text_stats, size=len(_plain_texts))
+    total = info['hits'] + info['misses']
+    info['hit_rate'] = info['hits'] / total if total else 0.0
+    return info
+
+
+@receiver(setting_changed)
+def clear_html_to_plain_text_cache(setting=None, **kwargs):
+    """Clears the plain text cache, e.g. if the parser settings change."""
+    if setting is None or setting.startswith('HTML2PLAINTEXT_'):
+        with _plain_texts_lock:
+            _plain_texts.clear()
+            _plain_text_stats.update(hits=0, misses=0)
+
+
 def html_to_plain_text(html):
-    """Converts html code into formatted plain text."""
-    # Use BeautifulSoup to normalize the html
-    soup = BeautifulSoup(html, "html.parser")
-    # Init the parser
-    parser = HTML2PlainParser()
-    if six.PY2:
-        soup = soup.encode('utf-8')
-        soup = bytes(soup)
+    """
+    Converts html code into formatted plain text.
+
+    If ``HTML2PLAINTEXT_CACHE_SIZE`` is set, the results for that many
+    different strings are cached, so repeated html is only converted once.
+
+    """
+    cache_size = getattr(settings, 'HTML2PLAINTEXT_CACHE_SIZE', 0)
+    if not cache_size or not isinstance(html, (str, bytes)):
+        return convert_html_to_plain_text(html)
+    if isinstance(html, str):
+        key = b's' + hashlib.blake2b(
+            html.encode('utf-8', 'surrogatepass')).digest()
     else:
-        soup = str(soup)
-    parser.feed(soup)
+        key = b'b' + hashlib.blake2b(html).digest()
+    with _plain_texts_lock:
+        result = _plain_texts.get(key)
+        if result is not None:
+            _plain_texts.move_to_end(key)
+            _plain_text_stats['hits'] += 1
+            return result
+        _plain_text_stats['misses'] += 1
+    result = convert_html_to_plain_text(html)
+    with _plain_texts_lock:
+        _plain_texts[key] = result
+        while len(_plain_texts) > cache_size:
+            _plain_texts.popitem(last=False)
+    return result
+
+
+def convert_html_to_plain_text(html):
+    """
+    Converts html code into formatted plain text without caching it.
+
+    Bytes are decoded as UTF-8. Other encodings are detected by BeautifulSoup,
+    if it is installed and the html is passed as a whole.
+
+    """
+    use_beautifulsoup = (
+        getattr(settings, 'HTML2PLAINTEXT_USE_BEAUTIFULSOUP', False)
+        and BeautifulSoup is not None)
+    if hasattr(html, 'read'):
+        html = html.read()
+    if (isinstance(html, bytes) and not use_beautifulsoup
+            and BeautifulSoup is not None):
+        try:
+            html = html.decode('utf-8')
+        except UnicodeDecodeError:
+            # Let BeautifulSoup detect the encoding
+            use_beautifulsoup = True
+    if use_beautifulsoup:
+        # Use BeautifulSoup to normalize the html
+        soup = BeautifulSoup(html, "html.parser")
+        # Init the parser
+        parser = HTML2PlainParser()
+        if six.PY2:
+            soup = soup.encode('utf-8')
+            soup = bytes(soup)
+        else:
+            soup = str(soup)
+        parser.feed(soup)
+    else:
+        parser = TolerantHTML2PlainParser()
+        # Chunks might end in the middle of a character
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        if isinstance(html, (str, bytes)):
+            html = [html]
+        for chunk in html:
+            if isinstance(chunk, bytes):
+                chunk = decoder.decode(chunk)
+            parser.feed(chunk)
+        parser.feed(decoder.decode(b'', final=True))
+        parser.close()
     # Strip the end of the plain text
-    result = parser.text.strip()
+    result = [parser.text.strip()]
     # Add footnotes
     if parser.links:
-        result += '\n\n'
+        result.append('\n\n')
         for link in parser.links:
-            result += '[{}]: {}\n'.format(link[0], link[1])
-    return result
+            result.append('[{}]: {}\n'.format(link[0], link[1]))
+    return ''.join(result)
+
+
+def iter_html_to_plain_text(chunks):
+    """
+    Converts chunks of html code into chunks of formatted plain text.
+
+    Text is yielded as soon as it can't change anymore, the footnotes of the
+    links at the end. The joined chunks are the same as the result of
+    ``html_to_plain_text`` for the whole html code.
+
+    """
+    parser = TolerantHTML2PlainParser()
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    started = False
+    for chunk in chunks:
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        parser.feed(chunk)
+        text = parser.pop_final_text()
+        if not started:
+            # The beginning of the text is stripped
+            text = text.lstrip()
+        if text:
+            started = True
+            yield text
+    parser.feed(decoder.decode(b'', final=True))
+    parser.close()
+    text = parser.text.rstrip()
+    if not started:
+        text = text.lstrip()
+    if text:
+        yield text
+    # Add footnotes
+    if parser.links:
+        yield '\n\n'
+        for link in parser.links:
+            yield '[{}]: {}\n'.format(link[0], link[1])
@@ -1,4 +1,12 @@
 """Useful decorators."""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.core.cache import caches
+from django.db import connections
 
 
 class conditional_decorator(object):
@@ -21,3 +29,170 @@ class conditional_decorator(object):
             # Return the function unchanged, not decorated.
             return func
         return self.decorator(func)
+
+
+class CachedFunction(object):
+    """Holds the caches and statistics of a function decorated by ``cached``."""
+    def __init__(self, func, timeout, key, maxsize, local_timeout,
+                 stale_timeout, cache_alias):
+        self.func = func
+        self.timeout = timeout
+        self.key = key
+        self.maxsize = maxsize
+        self.local_timeout = local_timeout
+        self.stale_timeout = stale_timeout
+        self.cache_alias = cache_alias
+        self.prefix = 'django_libs:cached:{0}.{1}'.format(
+            func.__module__, func.__qualname__)
+        self.local = OrderedDict()
+        self.lock = threading.Lock()
+        self.refreshing = set()
+        self.hits = {'local': 0, 'shared': 0, 'stale': 0, 'miss': 0}
+
+    @property
+    def cache(self):
+        # ``caches`` returns a cache instance per thread, because the clients
+        # of some backends are not thread-safe
+        return caches[self.cache_alias]
+
+    def __call__(self, *args, **kwargs):
+        if self.key is None:
+            arg_key = repr((args, sorted(kwargs.items())))
+        else:
+            arg_key = self.key(*args, **kwargs)
+        now = time.time()
+        with self.lock:
+            entry = self.local.get(arg_key)
+            if entry is not None and now < entry[1]:
+                self.local.move_to_end(arg_key)
+                self.hits['local'] += 1
+                return entry[0]
+
+        cache_key = self.get_cache_key(arg_key)
+        entry = self.cache.get(cache_key)
+        if entry is None:
+            self.count('miss')
+            return self.update(cache_key, arg_key, args, kwargs)
+        value, expires = entry
+        if now < expires:
+            self.count('shared')
+            self.store_local(arg_key, value, expires)
+        else:
+            # Serve the stale value, while it is being refreshed
+            self.count('stale')
+            self.refresh(cache_key, arg_key, args, kwargs)
+        return value
+
+    def count(self, name):
+        with self.lock:
+            self.hits[name] += 1
+
+    def get_cache_key(self, arg_key):
+        version = self.cache.get_or_set(
+            '{0}:version'.format(self.prefix), 1, None)
+        return '{0}:{1}:{2}'.format(self.prefix, version, hashlib.md5(
+            arg_key.encode('utf-8')).hexdigest())
+
+    def update(self, cache_key, arg_key, args, kwargs):
+        """Calls the function and caches its result."""
+        value = self.func(*args, **kwargs)
+        expires = time.time() + self.timeout
+        self.cache.set(cache_key, (value, expires),
+                       self.timeout + self.stale_timeout)
+        self.store_local(arg_key, value, expires)
+        return value
+
+    def store_local(self, arg_key, value, expires):
+        with self.lock:
+            self.local[arg_key] = (
+                value, min(expires, time.time() + self.local_timeout))
+            self.local.move_to_end(arg_key)
+            while len(self.local) > self.maxsize:
+                self.local.popitem(last=False)
+
+    def refresh(self, cache_key, arg_key, args, kwargs):
+        """Updates the cached result in a background thread."""
+        with self.lock:
+            if cache_key in self.refreshing:
+                return
+            self.refreshing.add(cache_key)
+
+        def target():
+            try:
+                self.update(cache_key, arg_key, args, kwargs)
+            finally:
+                with self.lock:
+                    self.refreshing.discard(cache_key)
+                # Threads open their own database connections
+                connections.close_all()
+
+        thread = threading.Thread(target=target)
+        thread.daemon = True
+        thread.start()
+
+    def invalidate(self):
+        """Invalidates all cached results of the function."""
+        key = '{0}:version'.format(self.prefix)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            # The version has not been requested yet or has been evicted
+            self.cache.set(key, 2, None)
+        with self.lock:
+            self.local.clear()
+
+    def stats(self):
+        """Returns the number of hits and misses and the hit rate."""
+        with self.lock:
+            stats = dict(self.hits)
+        total = sum(stats.values())
+        stats['hit_rate'] = (total - stats['miss']) / total if total else 0.0
+        return stats
+
+
+class cached(object):
+    """
+    Caches the results of a function in memory and in a Django cache.
+
+    Results are looked up in a bounded in-process LRU cache first and in the
+    cache backend after that::
+
+        @cached(timeout=60 * 60, key=lambda site_id: str(site_id))
+        def get_site(site_id):
+            return Site.objects.get(pk=site_id)
+
+        get_site.invalidate()
+        get_site.stats()
+
+    :timeout: Seconds until a result expires.
+    :key: A function that returns the key for the arguments of a call.
+      Defaults to the ``repr`` of the arguments.
+    :maxsize: The maximum number of results in the in-process cache.
+    :local_timeout: Seconds to keep results in the in-process cache. Other
+      processes only see invalidations after that, so keep it short.
+    :stale_timeout: Seconds to serve an expired result, while it is being
+      refreshed in a background thread.
+    :cache_alias: The Django cache to use.
+
+    """
+    def __init__(self, timeout=300, key=None, maxsize=128, local_timeout=5,
+                 stale_timeout=0, cache_alias='default'):
+        self.options = {
+            'timeout': timeout,
+            'key': key,
+            'maxsize': maxsize,
+            'local_timeout': local_timeout,
+            'stale_timeout': stale_timeout,
+            'cache_alias': cache_alias,
+        }
+
+    def __call__(self, func):
+        cached_function = CachedFunction(func, **self.options)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return cached_function(*args, **kwargs)
+
+        wrapper.invalidate = cached_function.invalidate
+        wrapper.stats = cached_function.stats
+        return wrapper
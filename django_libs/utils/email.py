@@ -1,9 +1,32 @@
 """Utility functions for sending emails."""
+import re
+import smtplib
+import socket
+import uuid
+
 from django.conf import settings
 from django.contrib.sites.models import Site
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template.base import (
+    FilterExpression,
+    Node,
+    Token,
+    TokenType,
+    Variable,
+    VariableNode,
+)
+from django.template.defaulttags import (
+    AutoEscapeControlNode,
+    ForNode,
+    IfNode,
+    WithNode,
+)
+from django.template.loader import get_template, render_to_string
+from django.template.loader_tags import BlockNode, ExtendsNode, IncludeNode
+from django.template.smartif import TokenBase
 from django.utils.encoding import force_str
+from django.utils.html import conditional_escape
+from django.utils.safestring import mark_safe
 
 try:
     import mailer
@@ -15,6 +38,11 @@ from .converter import html_to_plain_text
 from ..loaders import load_member_from_setting
 
 
+# Tags, that output the content of their nodes unchanged
+TRANSPARENT_NODES = (AutoEscapeControlNode, BlockNode, ExtendsNode, ForNode,
+                     IfNode, IncludeNode, WithNode)
+
+
 def send_email(request, context, subject_template, body_template,
                from_email, recipients, priority="medium", reply_to=None,
                headers=None, cc=None, bcc=None):
@@ -39,10 +67,25 @@ def send_email(request, context, subject_template, body_template,
     :param bcc: A list of BCC recipients
     """
     headers = headers or {}
-    if not reply_to:
-        reply_to = from_email
+    context.update(get_email_context(request))
+    email = render_email(
+        request, context, subject_template, body_template, from_email,
+        recipients, reply_to=reply_to, headers=headers, cc=cc, bcc=bcc)
+    if settings.EMAIL_BACKEND == 'mailer.backend.DbBackend':
+        queue_mailer_message(email, priority)
+    else:
+        email.send()
+
+
+def get_email_context(request):
+    """
+    Returns the variables, that ``send_email`` adds to the templates' context.
+
+    These are ``domain``, ``protocol`` and the result of the function of the
+    ``DJANGO_LIBS_EMAIL_CONTEXT`` setting.
 
-    # Add additional context
+    """
+    context = {}
     if hasattr(settings, 'DJANGO_LIBS_EMAIL_CONTEXT'):
         context_fn = load_member_from_setting('DJANGO_LIBS_EMAIL_CONTEXT')
         context.update(context_fn(request))
@@ -51,15 +94,184 @@ def send_email(request, context, subject_template, body_template,
         domain = request.get_host()
         protocol = 'https://' if request.is_secure() else 'http://'
     else:
-        domain = getattr(settings, 'DOMAIN', Site.objects.get_current().domain)
+        if hasattr(settings, 'DOMAIN'):
+            domain = settings.DOMAIN
+        else:
+            domain = Site.objects.get_current().domain
         protocol = getattr(settings, 'PROTOCOL', 'http://')
     context.update({
         'domain': domain,
         'protocol': protocol,
     })
-    subject = render_to_string(template_name=subject_template, context=context, request=request)
+    return context
+
+
+class Slot(str):
+    """
+    Placeholder for a personal variable while rendering the shared part.
+
+    Its text marks the position of a value, that is output without escaping,
+    ``__html__`` the position of an escaped one.
+
+    """
+    def __html__(self):
+        return self.escaped
+
+
+class EmailTemplate(object):
+    """
+    A template, that is rendered for many recipients.
+
+    Only the ``personal`` variables change between the recipients. The
+    template is rendered once with the shared ``context`` and placeholders for
+    them. ``render`` only escapes the personal values and joins them with the
+    rendered parts.
+
+    This works, if the personal variables are only output by plain tags like
+    ``{{ name }}`` (without filters and not inside of tags like ``filter`` or
+    ``spaceless``). Otherwise, or if a personal value is no string, the
+    template is rendered completely. Custom tags, that read the personal
+    variables from the context themselves, aren't detected.
+
+    :template_name: The path to the template.
+    :personal: The names of the variables, that change between recipients.
+    :context: The shared context.
+    :request: The current request instance.
+
+    """
+    def __init__(self, template_name, personal, context=None, request=None):
+        self.template = get_template(template_name)
+        self.personal = frozenset(personal)
+        self.context = dict(context or {})
+        self.request = request
+        self.parts = None
+        self.slots = []
+        if self.is_compilable():
+            self.compile()
+
+    def is_compilable(self):
+        """Returns ``True``, if the personal values can be filled in later."""
+        template = getattr(self.template, 'template', None)
+        if not hasattr(template, 'nodelist'):
+            # Not a Django template
+            return False
+        return self.check_nodelist(template.engine, template.nodelist, False,
+                                   set([(template.name, False)]))
+
+    def check_nodelist(self, engine, nodelist, opaque, visited):
+        for node in nodelist:
+            if isinstance(node, VariableNode):
+                expression = node.filter_expression
+                if not self.references(expression):
+                    continue
+                if (opaque or expression.filters
+                        or len(expression.var.lookups) > 1):
+                    return False
+                continue
+            if getattr(node, 'takes_context', False):
+                return False
+            if self.references([
+                    value for name, value in vars(node).items()
+                    if name not in ('origin', 'token')]):
+                return False
+            if isinstance(node, (ExtendsNode, IncludeNode)):
+                if isinstance(node, ExtendsNode):
+                    expression = node.parent_name
+                else:
+                    expression = node.template
+                if not self.is_constant(expression):
+                    return False
+                if (expression.var, opaque) not in visited:
+                    visited.add((expression.var, opaque))
+                    template = engine.get_template(expression.var)
+                    if not self.check_nodelist(
+                            engine, template.nodelist, opaque, visited):
+                        return False
+            for attr in node.child_nodelists:
+                if not self.check_nodelist(
+                        engine, getattr(node, attr, None) or [],
+                        opaque or not isinstance(node, TRANSPARENT_NODES),
+                        visited):
+                    return False
+        return True
+
+    def is_constant(self, expression):
+        return (isinstance(expression, FilterExpression)
+                and isinstance(expression.var, str)
+                and not expression.filters)
+
+    def references(self, value):
+        """Returns ``True``, if ``value`` uses a personal variable."""
+        if isinstance(value, Variable):
+            return bool(value.lookups) and value.lookups[0] in self.personal
+        if isinstance(value, FilterExpression):
+            return self.references(value.var) or any(
+                self.references(arg)
+                for func, args in value.filters for lookup, arg in args)
+        if isinstance(value, Token):
+            if value.token_type != TokenType.VAR:
+                return False
+            return value.contents.split('|')[0].split('.')[0].strip() in (
+                self.personal)
+        if isinstance(value, TokenBase):
+            # Conditions of the if tag
+            return self.references(list(vars(value).values()))
+        if isinstance(value, dict):
+            value = value.values()
+        elif isinstance(value, Node) or not isinstance(value, (list, tuple)):
+            # Child nodes are checked by ``check_nodelist``
+            return False
+        return any(self.references(item) for item in value)
+
+    def compile(self):
+        token = uuid.uuid4().hex
+        names = sorted(self.personal)
+        context = dict(self.context)
+        for index, name in enumerate(names):
+            slot = Slot('\x00{0}r{1}\x00'.format(token, index))
+            slot.escaped = '\x00{0}e{1}\x00'.format(token, index)
+            context[name] = slot
+        rendered = self.template.render(context, self.request)
+        parts = re.split('\x00{0}([er])(\\d+)\x00'.format(token), rendered)
+        self.parts = []
+        for index in range(0, len(parts) - 1, 3):
+            self.parts.append(parts[index])
+            # ``render`` fills in the value at this index
+            self.slots.append((len(self.parts), names[int(parts[index + 2])],
+                               parts[index + 1] == 'e'))
+            self.parts.append('')
+        self.parts.append(parts[-1])
+
+    def render(self, context):
+        """
+        Returns the template rendered with the shared context updated by the
+        personal values in ``context``.
+
+        """
+        if self.parts is None or set(context) != self.personal or not all(
+                isinstance(value, str) for value in context.values()):
+            full_context = dict(self.context)
+            full_context.update(context)
+            return self.template.render(full_context, self.request)
+        parts = list(self.parts)
+        for index, name, escape in self.slots:
+            value = context[name]
+            parts[index] = conditional_escape(value) if escape else value
+        return mark_safe(''.join(parts))
+
+
+def render_email(request, context, subject_template, body_template,
+                 from_email, recipients, reply_to=None, headers=None, cc=None,
+                 bcc=None):
+    """
+    Returns the ``EmailMultiAlternatives``, that ``send_email`` sends.
+
+    The templates can be paths or ``EmailTemplate`` instances.
+
+    """
+    subject = render_template(subject_template, context, request)
     subject = ''.join(subject.splitlines())
-    message_html = render_to_string(template_name=body_template, context=context, request=request)
+    message_html = render_template(body_template, context, request)
     message_plaintext = html_to_plain_text(message_html)
     subject = force_str(subject)
     message = force_str(message_plaintext)
@@ -71,20 +283,130 @@ def send_email(request, context, subject_template, body_template,
         cc=cc,
         bcc=bcc,
         headers=headers,
-        reply_to=[reply_to],
+        reply_to=[reply_to or from_email],
     )
     email.attach_alternative(message_html, "text/html")
-    if settings.EMAIL_BACKEND == 'mailer.backend.DbBackend':
-        # We customize `mailer.send_html_mail` to enable CC and BCC
-        priority = mailer.get_priority(priority)
-        msg = make_message(
-            subject=subject,
-            body=message,
-            from_email=from_email,
-            to=recipients,
-            priority=priority,
-        )
-        msg.email = email
-        msg.save()
-    else:
-        email.send()
+    return email
+
+
+def render_template(template, context, request=None):
+    if isinstance(template, EmailTemplate):
+        return template.render(context)
+    return render_to_string(template_name=template, context=context, request=request)
+
+
+def queue_mailer_message(email, priority="medium"):
+    """Saves an email to the queue of django-mailer."""
+    # We customize `mailer.send_html_mail` to enable CC and BCC
+    priority = mailer.get_priority(priority)
+    msg = make_message(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email,
+        to=email.to,
+        priority=priority,
+    )
+    msg.email = email
+    msg.save()
+
+
+def _is_connection_error(error):
+    """
+    Returns ``True``, if an error of the SMTP backend means, that the
+    connection has been lost and sending again over a new one might succeed.
+
+    """
+    if isinstance(error, smtplib.SMTPResponseException):
+        # 421: The server is closing the connection, e.g. after too many
+        # messages
+        return error.smtp_code == 421
+    return isinstance(error, (smtplib.SMTPServerDisconnected, ConnectionError,
+                              socket.timeout))
+
+
+def send_mass_email(request, messages, subject_template, body_template,
+                    from_email, priority="medium", reply_to=None,
+                    headers=None, connection=None, context=None):
+    """
+    Sends many emails based on the same templates over one connection.
+
+    The templates are only rendered once with the shared ``context``. The
+    values of the messages' contexts are filled in for each message (see
+    ``EmailTemplate``).
+
+    The connection stays open for all messages. If it gets lost, e.g.
+    because the server only accepts a certain number of messages per
+    connection, it is opened again and the message is sent once more. If it
+    can't be opened again, sending is aborted and all remaining messages
+    fail with that error.
+
+    Returns a list with a tuple of the recipients and ``None`` or the error,
+    which prevented sending, for each message.
+
+    :param request: The current request instance.
+    :param messages: An iterable of tuples of a context dictionary and a list
+        of recipients. Every tuple results in one email.
+    :param connection: The email backend instance to use. Defaults to the
+        one of ``get_connection()``.
+    :param context: A dictionary of items, that are the same for all
+        messages.
+
+    The other parameters are the same as the ones of ``send_email``.
+
+    """
+    headers = headers or {}
+    extra_context = get_email_context(request)
+    shared_context = dict(context or {})
+    shared_context.update(extra_context)
+    templates = {}
+    results = []
+    use_mailer = settings.EMAIL_BACKEND == 'mailer.backend.DbBackend'
+    if not use_mailer and connection is None:
+        connection = get_connection()
+    if connection is not None:
+        connection.open()
+    messages = iter(messages)
+    error = None
+    try:
+        for message_context, recipients in messages:
+            # Like in ``send_email`` the extra context takes precedence
+            personal = frozenset(message_context).difference(extra_context)
+            if personal not in templates:
+                templates[personal] = [
+                    EmailTemplate(template, personal, shared_context, request)
+                    for template in (subject_template, body_template)]
+            email = render_email(
+                request, {name: message_context[name] for name in personal},
+                templates[personal][0], templates[personal][1], from_email,
+                recipients, reply_to=reply_to, headers=headers)
+            if use_mailer:
+                queue_mailer_message(email, priority)
+                results.append((recipients, None))
+                continue
+            try:
+                try:
+                    connection.send_messages([email])
+                except OSError as ex:
+                    if not _is_connection_error(ex):
+                        raise
+                    connection.close()
+                    try:
+                        connection.open()
+                    except OSError as ex:
+                        # Without a connection the backend would open and
+                        # close one for every further message
+                        error = ex
+                        break
+                    connection.send_messages([email])
+            except OSError as ex:
+                results.append((recipients, ex))
+            else:
+                results.append((recipients, None))
+        if error is not None:
+            results.append((recipients, error))
+            results.extend(
+                (recipients, error) for _, recipients in messages)
+    finally:
+        if connection is not None:
+            connection.close()
+    return results
@@ -0,0 +1,283 @@
+"""
+Lock backends for the ``lockfile`` decorator.
+
+Every backend is created with the name of the lock and implements
+``acquire(timeout)`` and ``release()``. ``acquire`` returns ``False``, if the
+lock couldn't be acquired within ``timeout`` seconds. A ``timeout`` of
+``None`` waits forever, a negative one doesn't wait at all.
+
+"""
+import datetime
+import hashlib
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # pragma: nocover
+    fcntl = None
+
+from django.core.cache import caches
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
+
+from .. import default_settings
+from ..loaders import load_member
+
+
+class BaseLock(object):
+    """Base class for locks, that have to poll until they are released."""
+    poll_interval = 0.1
+
+    def __init__(self, name):
+        self.name = name
+
+    def acquire(self, timeout=-1):
+        """Returns ``True``, if the lock has been acquired."""
+        deadline = None
+        if timeout is not None:
+            deadline = time.monotonic() + max(timeout, 0)
+        while not self.try_acquire():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(self.poll_interval)
+        return True
+
+    def try_acquire(self):
+        """Acquires the lock without waiting and returns ``True`` on success."""
+        raise NotImplementedError
+
+    def release(self):
+        raise NotImplementedError
+
+
+class FileLock(object):
+    """
+    Lock based on the ``FileLock`` of the ``lockfile`` package.
+
+    Only works on one host and leaves a stale lock file behind, if the
+    process gets killed.
+
+    """
+    def __init__(self, name):
+        import lockfile
+        self.lock = lockfile.FileLock(name)
+
+    def acquire(self, timeout=-1):
+        import lockfile
+        try:
+            self.lock.acquire(timeout)
+        except (lockfile.AlreadyLocked, lockfile.LockTimeout):
+            return False
+        return True
+
+    def release(self):
+        self.lock.release()
+
+
+class FlockLock(BaseLock):
+    """
+    Lock based on ``fcntl.flock``.
+
+    The operating system releases the lock as soon as the process dies, so
+    there are no stale locks. Works across hosts, if the lock file lives on a
+    shared file system, that supports ``flock``.
+
+    """
+    def __init__(self, name):
+        super(FlockLock, self).__init__(name)
+        self.path = '{0}.lock'.format(name)
+        self.file = None
+
+    def try_acquire(self):
+        lock_file = open(self.path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (BlockingIOError, PermissionError):
+            lock_file.close()
+            return False
+        self.file = lock_file
+        return True
+
+    def release(self):
+        fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
+        self.file = None
+
+
+class ExpiringLock(BaseLock):
+    """
+    Base class for locks, that expire after ``ttl`` seconds.
+
+    So they can't stay stale after a crash. While the lock is held, a
+    heartbeat thread renews it every ``ttl / 3`` seconds.
+
+    """
+    def __init__(self, name, ttl=60):
+        super(ExpiringLock, self).__init__(name)
+        self.ttl = ttl
+        self.token = None
+        self.stopped = threading.Event()
+        self.heartbeat_thread = None
+
+    def start_heartbeat(self):
+        self.stopped.clear()
+        self.heartbeat_thread = threading.Thread(target=self.heartbeat)
+        self.heartbeat_thread.daemon = True
+        self.heartbeat_thread.start()
+
+    def stop_heartbeat(self):
+        self.stopped.set()
+        if self.heartbeat_thread is not None:
+            self.heartbeat_thread.join()
+
+    def heartbeat(self):
+        while not self.stopped.wait(self.ttl / 3.0):
+            if not self.renew():
+                # Another process took over the expired lock
+                return
+
+    def renew(self):
+        """Extends the lock and returns ``False``, if it has been lost."""
+        raise NotImplementedError
+
+
+class DatabaseLock(ExpiringLock):
+    """
+    Lock stored in the database, that is shared by all hosts.
+
+    Uses advisory locks on PostgreSQL and MySQL, which are released, when the
+    database connection gets closed. All other databases store a ``Lock``
+    row, which expires after ``ttl`` seconds, if its process died.
+
+    """
+    def __init__(self, name, using='default', ttl=60):
+        super(DatabaseLock, self).__init__(name, ttl=ttl)
+        self.connection = connections[using]
+        self.digest = hashlib.sha1(name.encode('utf-8')).digest()
+
+    def execute(self, sql, params=None):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchone() if cursor.description else None
+
+    def get_queryset(self):
+        from ..models import Lock
+        return Lock.objects.using(self.connection.alias).filter(
+            name=self.digest.hex())
+
+    def try_acquire(self):
+        vendor = self.connection.vendor
+        if vendor == 'postgresql':
+            key = int.from_bytes(self.digest[:8], 'big', signed=True)
+            return self.execute('SELECT pg_try_advisory_lock(%s)', [key])[0]
+        if vendor == 'mysql':
+            return self.execute(
+                'SELECT GET_LOCK(%s, 0)', [self.digest.hex()])[0] == 1
+        token = uuid.uuid4().hex
+        now = timezone.now()
+        expires = now + datetime.timedelta(seconds=self.ttl)
+        # Take over the lock, if its holder died
+        if not self.get_queryset().filter(expires__lte=now).update(
+                token=token, expires=expires):
+            try:
+                with transaction.atomic(using=self.connection.alias):
+                    self.get_queryset().create(
+                        name=self.digest.hex(), token=token, expires=expires)
+            except IntegrityError:
+                return False
+        self.token = token
+        self.start_heartbeat()
+        return True
+
+    def heartbeat(self):
+        try:
+            super(DatabaseLock, self).heartbeat()
+        finally:
+            # The heartbeat thread has its own connection
+            connections[self.connection.alias].close()
+
+    def renew(self):
+        return bool(self.get_queryset().filter(token=self.token).update(
+            expires=timezone.now() + datetime.timedelta(seconds=self.ttl)))
+
+    def release(self):
+        vendor = self.connection.vendor
+        if vendor == 'postgresql':
+            key = int.from_bytes(self.digest[:8], 'big', signed=True)
+            self.execute('SELECT pg_advisory_unlock(%s)', [key])
+        elif vendor == 'mysql':
+            self.execute('SELECT RELEASE_LOCK(%s)', [self.digest.hex()])
+        else:
+            self.stop_heartbeat()
+            self.get_queryset().filter(token=self.token).delete()
+            self.token = None
+
+
+class CacheLock(ExpiringLock):
+    """
+    Lock stored in the cache, that is shared by all hosts.
+
+    The lock expires after ``ttl`` seconds, so it can't stay stale after a
+    crash. While it is held, a heartbeat thread renews it every ``ttl / 3``
+    seconds. Use a cache backend, that is shared by all hosts.
+
+    """
+    def __init__(self, name, ttl=60, cache_alias='default'):
+        super(CacheLock, self).__init__(name, ttl=ttl)
+        self.cache_alias = cache_alias
+        self.key = 'django_libs:lock:{0}'.format(
+            hashlib.md5(name.encode('utf-8')).hexdigest())
+
+    @property
+    def cache(self):
+        # The heartbeat thread needs a cache instance of its own, because the
+        # clients of some backends are not thread-safe
+        return caches[self.cache_alias]
+
+    def try_acquire(self):
+        token = uuid.uuid4().hex
+        if not self.cache.add(self.key, token, self.ttl):
+            return False
+        self.token = token
+        self.start_heartbeat()
+        return True
+
+    def renew(self):
+        if self.cache.get(self.key) != self.token:
+            return False
+        self.cache.touch(self.key, self.ttl)
+        return True
+
+    def release(self):
+        self.stop_heartbeat()
+        if self.cache.get(self.key) == self.token:
+            self.cache.delete(self.key)
+        self.token = None
+
+
+LOCK_BACKENDS = {
+    'file': FileLock,
+    'database': DatabaseLock,
+    'cache': CacheLock,
+}
+if fcntl is not None:
+    LOCK_BACKENDS['flock'] = FlockLock
+
+
+def get_lock_backend(backend=None):
+    """
+    Returns a lock class.
+
+    ``backend`` can be the name of a backend in ``LOCK_BACKENDS``, the path
+    to a lock class or the class itself. It defaults to the
+    ``DJANGO_LIBS_LOCK_BACKEND`` setting.
+
+    """
+    backend = backend or default_settings.LOCK_BACKEND
+    if not isinstance(backend, str):
+        return backend
+    if backend in LOCK_BACKENDS:
+        return LOCK_BACKENDS[backend]
+    return load_member(backend)
@@ -0,0 +1,124 @@
+"""
+Cache based rate limiting.
+
+Requests are counted with a sliding window. The counters of the current and
+the previous window are stored in the cache and incremented atomically, so
+the limits are shared by all processes, that share the cache.
+
+"""
+import hashlib
+import math
+import time
+
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from ..loaders import load_member
+
+
+PERIODS = {
+    's': 1,
+    'm': 60,
+    'h': 60 * 60,
+    'd': 24 * 60 * 60,
+}
+
+
+def parse_rate(rate):
+    """
+    Returns the number of requests and the window in seconds of a rate.
+
+    Rates look like ``'100/m'`` or ``'10/5s'``. Tuples of the number of
+    requests and seconds are returned unchanged.
+
+    """
+    if not isinstance(rate, str):
+        return rate
+    count, period = rate.split('/')
+    multiplier = period[:-1] or 1
+    return int(count), int(multiplier) * PERIODS[period[-1]]
+
+
+def get_ip(request):
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def get_user_or_ip(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return 'user:{0}'.format(user.pk)
+    return 'ip:{0}'.format(get_ip(request))
+
+
+KEYS = {
+    'ip': get_ip,
+    'user': get_user_or_ip,
+}
+
+
+class RateLimit(object):
+    """
+    Limits the number of requests of a client within a time window.
+
+    :rate: The allowed number of requests per window, e.g. ``'100/m'``.
+    :key: Identifies the client. ``'ip'``, ``'user'`` (the IP for anonymous
+      users), a function, that gets the request, or the path to it.
+    :group: Requests of the same group share their limit.
+    :cache_alias: The Django cache to store the counters in.
+
+    """
+    def __init__(self, rate, key='ip', group='default',
+                 cache_alias='default'):
+        self.limit, self.window = parse_rate(rate)
+        if callable(key):
+            self.key_func = key
+        elif key in KEYS:
+            self.key_func = KEYS[key]
+        else:
+            self.key_func = load_member(key)
+        self.group = group
+        # Groups can be any string, e.g. the path patterns of the middleware
+        self.group_digest = hashlib.md5(group.encode('utf-8')).hexdigest()
+        self.cache_alias = cache_alias
+
+    @property
+    def cache(self):
+        # ``caches`` returns a cache instance per thread, because the clients
+        # of some backends are not thread-safe
+        return caches[self.cache_alias]
+
+    def get_cache_key(self, request, window_index):
+        return 'django_libs:ratelimit:{0}:{1}:{2}'.format(
+            self.group_digest, self.key_func(request), window_index)
+
+    def hit(self, request):
+        """
+        Counts a request.
+
+        Returns ``None``, if the request is allowed, or the seconds after
+        which the client should try again.
+
+        """
+        now = time.time()
+        window_index, elapsed = divmod(now, self.window)
+        cache_key = self.get_cache_key(request, int(window_index))
+        # The counter is needed until the end of the next window
+        self.cache.add(cache_key, 0, self.window * 2)
+        try:
+            count = self.cache.incr(cache_key)
+        except ValueError:
+            # The counter has been evicted in between
+            self.cache.set(cache_key, 1, self.window * 2)
+            count = 1
+        previous = self.cache.get(
+            self.get_cache_key(request, int(window_index) - 1), 0)
+        weight = 1 - elapsed / self.window
+        if previous * weight + count <= self.limit:
+            return None
+        return max(1, int(math.ceil(self.window - elapsed)))
+
+    def get_response(self, retry_after):
+        response = HttpResponse('Too many requests', status=429,
+                                content_type='text/plain')
+        response['Retry-After'] = str(retry_after)
+        return response
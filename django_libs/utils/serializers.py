@@ -0,0 +1,89 @@
+"""JSON serialization utilities."""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Model
+from django.db.models.query import QuerySet
+
+try:
+    import orjson
+except ImportError:  # pragma: nocover
+    orjson = None
+
+from .. import default_settings
+from ..loaders import load_member
+
+
+class JSONEncoder(DjangoJSONEncoder):
+    """
+    JSON encoder that can also handle model instances and querysets.
+
+    Querysets are serialized as lists of their ``values()``, model instances
+    as dictionaries of the same shape. Everything else is handled like by
+    Django's ``DjangoJSONEncoder`` (dates, decimals, UUIDs, lazy strings).
+
+    """
+    def default(self, o):
+        if isinstance(o, QuerySet):
+            return list(o.values())
+        if isinstance(o, Model):
+            return dict((field.attname, field.value_from_object(o))
+                        for field in o._meta.concrete_fields)
+        return super(JSONEncoder, self).default(o)
+
+
+def json_dumps(obj):
+    """Serializes an object with the standard library ``json`` module."""
+    return json.dumps(obj, cls=JSONEncoder)
+
+
+def orjson_dumps(obj):
+    """
+    Serializes an object with the much faster ``orjson`` library.
+
+    Dates and times are passed to the ``JSONEncoder``, so they are formatted
+    exactly like with ``json_dumps``.
+
+    """
+    return orjson.dumps(
+        obj, default=JSONEncoder().default,
+        option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+    ).decode('utf-8')
+
+
+SERIALIZERS = {
+    'json': json_dumps,
+}
+if orjson is not None:
+    SERIALIZERS['orjson'] = orjson_dumps
+
+
+def register_serializer(name, func):
+    """Registers a function that turns an object into a JSON string."""
+    SERIALIZERS[name] = func
+
+
+def get_separators(serializer):
+    """
+    Returns the item and key separators, that a serializer puts out.
+
+    E.g. ``(', ', ': ')`` for ``json_dumps`` and ``(',', ':')`` for
+    ``orjson_dumps``.
+
+    """
+    # '[1, 2]' and '{"a": 1}'
+    return serializer([1, 2])[2:-2], serializer({'a': 1})[4:-2]
+
+
+def get_serializer(name=None):
+    """
+    Returns a JSON serializer function.
+
+    ``name`` can be the name of a registered serializer or the path to a
+    function. It defaults to the ``DJANGO_LIBS_JSON_SERIALIZER`` setting.
+
+    """
+    name = name or default_settings.JSON_SERIALIZER
+    if name in SERIALIZERS:
+        return SERIALIZERS[name]
+    return load_member(name)
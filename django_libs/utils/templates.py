@@ -0,0 +1,76 @@
+"""Template related utilities."""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.template import engines
+
+
+def get_template_dirs(engine):
+    """
+    Returns all directories, in which the given engine looks for templates.
+
+    For the Django template engine, we ask the configured loaders, so custom
+    ``loaders`` settings are respected, too.
+
+    """
+    if not hasattr(engine, 'engine'):
+        return list(engine.template_dirs)
+    template_dirs = []
+    for loader in engine.engine.template_loaders:
+        if hasattr(loader, 'get_dirs'):
+            template_dirs.extend(
+                d for d in loader.get_dirs() if d not in template_dirs)
+    return template_dirs
+
+
+def get_template_names(engine, extensions=('html', 'txt')):
+    """Returns the names of all templates that the engine can find."""
+    extensions = tuple('.{0}'.format(ext.lstrip('.')) for ext in extensions)
+    names = []
+    for template_dir in get_template_dirs(engine):
+        for root, dirs, files in os.walk(str(template_dir)):
+            for filename in files:
+                if not filename.endswith(extensions):
+                    continue
+                name = os.path.relpath(
+                    os.path.join(root, filename), str(template_dir))
+                name = name.replace(os.sep, '/')
+                if name not in names:
+                    names.append(name)
+    return names
+
+
+def compile_template(engine, name):
+    """
+    Loads and compiles a template.
+
+    Returns a tuple of the template name, the seconds it took and the raised
+    exception or ``None`` if the template compiled successfully.
+
+    """
+    start = time.time()
+    try:
+        engine.get_template(name)
+    except Exception as ex:
+        return name, time.time() - start, ex
+    return name, time.time() - start, None
+
+
+def warm_templates(extensions=('html', 'txt'), workers=None):
+    """
+    Compiles all templates of all configured template engines.
+
+    If an engine uses the cached template loader, the compiled templates stay
+    in its cache, so the first requests after a deployment don't have to pay
+    for loading and compiling them.
+
+    Returns a list of the results of ``compile_template``.
+
+    """
+    jobs = []
+    for engine in engines.all():
+        jobs.extend((engine, name) for name in get_template_names(
+            engine, extensions))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda job: compile_template(*job), jobs))
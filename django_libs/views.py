@@ -1,22 +1,94 @@
 """Views for testing 404 and 500 templates."""
 import json
 import datetime
+import hashlib
 import math
+import os
 from functools import update_wrapper
 
 from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
 try:
     from django_comments.models import Comment
 except ImportError:
     pass
-from django.http import Http404, HttpResponse, HttpResponseForbidden
-from django.template import loader, Context
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+)
+from django.template import TemplateDoesNotExist, loader
+from django.utils.cache import (
+    cc_delim_re,
+    get_conditional_response,
+    has_vary_header,
+    patch_vary_headers,
+)
+from django.utils.http import quote_etag, urlencode
+from django.utils.translation import get_language
 from django.views.generic import TemplateView, View
 
 from . import default_settings
 
 
+# Maps template names of error pages to tuples of the rendered content, the
+# path of the template file and its modification time.
+_error_pages = {}
+
+
+def _get_mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except (OSError, TypeError):
+        return None
+
+
+def render_error_page(template_name):
+    """
+    Renders an error page and keeps the result in memory.
+
+    The template is rendered without a request, so no context processors are
+    executed.
+
+    """
+    template = loader.get_template(template_name)
+    path = getattr(getattr(template, 'origin', None), 'name', None)
+    content = template.render({}).encode(settings.DEFAULT_CHARSET)
+    _error_pages[template_name] = (content, path, _get_mtime(path))
+    return content
+
+
+def get_error_page(template_name):
+    """
+    Returns the rendered content of an error page.
+
+    The page is only rendered once. If ``DEBUG`` is ``True``, it is rendered
+    again whenever its template file has been changed.
+
+    """
+    try:
+        content, path, mtime = _error_pages[template_name]
+    except KeyError:
+        return render_error_page(template_name)
+    if settings.DEBUG and _get_mtime(path) != mtime:
+        return render_error_page(template_name)
+    return content
+
+
+def prerender_error_pages():
+    """Renders all error pages that are used by the error handler views."""
+    for view_class in (PrerenderedHttp404View, PrerenderedHttp500View):
+        try:
+            render_error_page(view_class.template_name)
+        except Exception:
+            # The views try again on their first request and serve their
+            # fallback content, if that fails, too
+            pass
+
+
 class Http404TestView(TemplateView):
     """
     WARNING: This view is deprecated. Use the ``RapidPrototypingView`` instead.
@@ -33,6 +105,50 @@ class Http500TestView(TemplateView):
     template_name = '500.html'
 
 
+class PrerenderedHttp404View(View):
+    """
+    Error handler view that serves a pre-rendered ``404.html``.
+
+    Rendering the error page for every request costs CPU during 404 floods and
+    might even fail during an outage, if the template or the context
+    processors hit the database. This view renders the template once without
+    a request and serves the same bytes afterwards.
+
+    """
+    template_name = '404.html'
+    status = 404
+    fallback_content = (
+        b'<h1>Not Found</h1>'
+        b'<p>The requested resource was not found on this server.</p>')
+    # Errors while rendering the page, that lead to the fallback content
+    fallback_exceptions = (TemplateDoesNotExist, )
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            content = get_error_page(self.template_name)
+        except self.fallback_exceptions:
+            content = self.fallback_content
+        return HttpResponse(content, status=self.status)
+
+
+class PrerenderedHttp500View(PrerenderedHttp404View):
+    """
+    Error handler view that serves a pre-rendered ``500.html``.
+
+    It serves the fallback content on any error, because nothing handles
+    errors of the 500 handler itself.
+
+    """
+    template_name = '500.html'
+    status = 500
+    fallback_content = b'<h1>Server Error (500)</h1>'
+    fallback_exceptions = (Exception, )
+
+
+page_not_found = PrerenderedHttp404View.as_view()
+server_error = PrerenderedHttp500View.as_view()
+
+
 class HybridView(View):
     """
     View that renders different views depending on wether the user is authed.
@@ -44,11 +160,21 @@ class HybridView(View):
     ``authed_view_kwargs`` and ``anonymous_view_kwargs`` which, of course,
     should be dictionaries.
 
+    If you set ``anonymous_cache_timeout``, the responses of the
+    ``anonymous_view`` are cached for that many seconds, keyed by method,
+    host, path, the query string in canonical order, active language and the
+    headers in the ``Vary`` header of the response. ``Cookie`` is left out,
+    because the response doesn't depend on the cookies of anonymous users.
+    Responses that set cookies, access the session or use the CSRF token are
+    never cached.
+
     """
+    cache_key_prefix = 'django_libs:hybrid_view'
     authed_view = None
     authed_view_kwargs = None
     anonymous_view = None
     anonymous_view_kwargs = None
+    anonymous_cache_timeout = None
 
     @classmethod
     def as_view(cls, **initkwargs):
@@ -93,51 +219,229 @@ class HybridView(View):
             else is_authenticated()
         if authenticated:
             view_kwargs = self.authed_view_kwargs or {}
-            return self.authed_view(request, **view_kwargs)
+            response = self.authed_view(request, **view_kwargs)
+            if self.anonymous_cache_timeout:
+                patch_vary_headers(response, ('Cookie', ))
+            return response
 
         view_kwargs = self.anonymous_view_kwargs or {}
-        return self.anonymous_view(request, **view_kwargs)
+        if (not self.anonymous_cache_timeout
+                or request.method not in ('GET', 'HEAD')):
+            return self.anonymous_view(request, **view_kwargs)
+        headers_key = self.get_anonymous_headers_cache_key(request)
+        headers = cache.get(headers_key)
+        response = None
+        if headers is not None:
+            response = cache.get(
+                self.get_anonymous_cache_key(request, headers))
+        if response is None:
+            session = getattr(request, 'session', None)
+            session_accessed = getattr(session, 'accessed', None)
+            if session_accessed is not None:
+                # Only accesses of the anonymous view prevent caching
+                session.accessed = False
+            response = self.anonymous_view(request, **view_kwargs)
+            if hasattr(response, 'render') and callable(response.render):
+                # Render template responses now, so we know if the CSRF token
+                # has been used and so we can store the content
+                response.render()
+            patch_vary_headers(response, ('Cookie', ))
+            if self.is_cacheable(request, response):
+                # Remember the headers in ``Vary`` like Django's cache
+                # middleware does, so we can build the key before the view
+                # has been called next time
+                headers = sorted(
+                    'HTTP_' + header.upper().replace('-', '_')
+                    for header in cc_delim_re.split(response['Vary'])
+                    if header.lower() != 'cookie')
+                cache.set(headers_key, headers, self.anonymous_cache_timeout)
+                cache.set(self.get_anonymous_cache_key(request, headers),
+                          response, self.anonymous_cache_timeout)
+            if session_accessed is not None:
+                session.accessed = session.accessed or session_accessed
+        return response
+
+    def get_anonymous_headers_cache_key(self, request):
+        """Returns the key of the ``Vary`` headers of the requested URL."""
+        query = urlencode(sorted(request.GET.lists()), doseq=True)
+        key = '{0}{1}?{2}'.format(request.get_host(), request.path, query)
+        return '{0}:headers:{1}'.format(
+            self.cache_key_prefix,
+            hashlib.md5(key.encode('utf-8')).hexdigest())
+
+    def get_anonymous_cache_key(self, request, headers):
+        """
+        Returns the cache key for the anonymous response of a request.
+
+        :param headers: The ``META`` keys of the headers in ``Vary``.
+
+        """
+        query = urlencode(sorted(request.GET.lists()), doseq=True)
+        key = [request.method, request.get_host(), request.path, query,
+               get_language() or '']
+        key.extend(request.META.get(header, '') for header in headers)
+        return '{0}:{1}'.format(
+            self.cache_key_prefix,
+            hashlib.md5('\n'.join(key).encode('utf-8')).hexdigest())
+
+    def is_cacheable(self, request, response):
+        """Returns ``True`` if the anonymous response can be shared."""
+        if response.status_code != 200 or response.streaming:
+            return False
+        if has_vary_header(response, '*'):
+            return False
+        if response.cookies or request.META.get('CSRF_COOKIE_USED'):
+            return False
+        session = getattr(request, 'session', None)
+        if getattr(session, 'accessed', False):
+            # The content might depend on the session
+            return False
+        cache_control = response.get('Cache-Control', '')
+        return not ('private' in cache_control or 'no-store' in cache_control)
+
+
+def get_content_type(ctype):
+    """
+    Returns the content type of ``ctype`` like ``'auth.user'`` or ``None``.
+
+    ``ContentType.objects`` caches the content types, so we only hit the
+    database once per content type.
+
+    """
+    try:
+        app_label, model = ctype.lower().split('.')
+        return ContentType.objects.get_by_natural_key(app_label, model)
+    except (AttributeError, ValueError, ContentType.DoesNotExist):
+        return None
+
+
+def get_comment_cache_version(content_type_id, object_pk):
+    """Returns the current cache version of the comments of an object."""
+    return cache.get_or_set(
+        'django_libs:comments:version:{0}:{1}'.format(
+            content_type_id, object_pk), 1, timeout=None)
+
+
+def bump_comment_cache_version(content_type_id, object_pk):
+    """
+    Invalidates all cached comment pages of an object.
+
+    Instead of deleting every single page, we increment the version that is
+    part of the page cache keys. Outdated pages will simply expire.
+
+    """
+    key = 'django_libs:comments:version:{0}:{1}'.format(
+        content_type_id, object_pk)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # The version has not been requested yet or has been evicted
+        cache.set(key, 2, timeout=None)
+
+
+def invalidate_comment_cache(sender, instance, **kwargs):
+    """Receiver for ``post_save`` and ``post_delete`` of comments."""
+    bump_comment_cache_version(instance.content_type_id, instance.object_pk)
 
 
 class PaginatedCommentAJAXView(TemplateView):
-    """Returns a page of comments for an object."""
+    """
+    Returns a page of comments for an object.
+
+    The rendered pages are cached per language until a comment of the object
+    is saved or deleted or ``COMMENTS_CACHE_TIMEOUT`` has passed. Conditional
+    GET requests are answered with ``304 Not Modified``.
+
+    Only the fields in ``comment_fields`` are loaded from the database. If
+    your customized templates display further fields of the comments or their
+    users, add them there to avoid a query per comment.
+
+    """
     template_name = 'django_libs/partials/ajax_comments.html'
+    comment_fields = ('comment', 'submit_date', 'user', 'user__first_name',
+                      'user__last_name')
 
     def dispatch(self, request, *args, **kwargs):
         if not request.is_ajax():
             raise Http404
-
-        self.comments = Comment.objects.filter(
-            content_type__name=request.GET.get('ctype'),
-            object_pk=request.GET.get('object_pk'))
         return super(PaginatedCommentAJAXView, self).dispatch(
             request, *args, **kwargs)
 
     def get(self, request, *args, **kwargs):
+        cache_key = self.get_cache_key()
+        content = None
+        if cache_key:
+            content = cache.get(cache_key)
+        if content is None:
+            content = self.render_content()
+            if cache_key:
+                cache.set(cache_key, content,
+                          default_settings.COMMENTS_CACHE_TIMEOUT)
+        etag = quote_etag(hashlib.md5(content.encode('utf-8')).hexdigest())
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(content, content_type="application/json")
+        response['ETag'] = etag
+        return response
+
+    def get_cache_key(self):
+        """
+        Returns the key of the currently requested page.
+
+        Returns ``None`` if caching has been disabled or the content type
+        doesn't exist.
+
+        """
+        if not default_settings.COMMENTS_CACHE_TIMEOUT:
+            return None
+        content_type = get_content_type(self.request.GET.get('ctype'))
+        if content_type is None:
+            return None
+        object_pk = self.request.GET.get('object_pk')
+        key = 'django_libs:comments:page:{0}:{1}:{2}:{3}:{4}:{5}'.format(
+            content_type.pk, object_pk,
+            get_comment_cache_version(content_type.pk, object_pk),
+            self.request.GET.get('page'), self.request.GET.get('comment_pk'),
+            get_language())
+        # Make sure that user input doesn't produce invalid cache keys
+        return hashlib.md5(key.encode('utf-8')).hexdigest()
+
+    def get_comments(self):
+        """Returns all comments of the requested object."""
+        content_type = get_content_type(self.request.GET.get('ctype'))
+        if content_type is None:
+            return Comment.objects.none()
+        return Comment.objects.filter(
+            content_type=content_type,
+            object_pk=self.request.GET.get('object_pk'),
+        ).select_related('user').only(*self.comment_fields)
+
+    def render_content(self):
+        """Renders the requested page and returns the JSON payload."""
         template = loader.get_template(self.template_name)
-        content = template.render(Context(self.get_context_data()))
-        return HttpResponse(json.dumps({
+        content = template.render(self.get_context_data())
+        return json.dumps({
             'data': content, 'page': self.page,
             'has_prev': self.page_obj.has_previous(),
-            'has_next': self.page_obj.has_next()}),
-            content_type="application/json")
+            'has_next': self.page_obj.has_next()})
 
     def get_context_data(self):
         ctx = super(PaginatedCommentAJAXView, self).get_context_data()
+        self.comments = self.get_comments()
 
         # Let's try to figure out if a special comment was requested
         page = None
         comment_pk = self.request.GET.get('comment_pk')
         if comment_pk:
             try:
-                self.comment = Comment.objects.get(
+                self.comment = Comment.objects.only('pk').get(
                     pk=comment_pk, is_public=True, is_removed=False)
             except Comment.DoesNotExist:
                 self.comment = None
             if self.comment:
                 index = 1
-                for item in self.comments:
-                    if item == self.comment:
+                for pk in self.comments.values_list('pk', flat=True):
+                    if pk == self.comment.pk:
                         # The special comment is indeed part of all comments,
                         # so let's calculate the page it should be on
                         page = math.ceil(float(index) / default_settings.COMMENTS_PAGINATE_BY)
@@ -198,21 +502,84 @@ class UpdateSessionAJAXView(View):
         return HttpResponse('done')
 
 
+def set_cookie(response, key, value, days=100):
+    """Sets a cookie, that expires after the given amount of days."""
+    date = datetime.datetime.utcnow() + datetime.timedelta(days=days)
+    expires = datetime.datetime.strftime(date, "%a, %d-%b-%Y %H:%M:%S GMT")
+    response.set_cookie(
+        key,
+        value,
+        max_age=(days * 24 * 60 * 60),
+        expires=expires,
+        domain=settings.SESSION_COOKIE_DOMAIN,
+        secure=settings.SESSION_COOKIE_SECURE or None,
+    )
+
+
 class UpdateCookieAJAXView(View):
     """View to update a cookie in an AJAX post."""
     def dispatch(self, request, *args, **kwargs):
         if not (self.request.headers.get('x-requested-with') == 'XMLHttpRequest' and request.method == 'POST'):
             return HttpResponseForbidden()
         response = HttpResponse('done')
-        days = int(request.POST.get('cookie_days', 100))
-        date = datetime.datetime.utcnow() + datetime.timedelta(days=days)
-        expires = datetime.datetime.strftime(date, "%a, %d-%b-%Y %H:%M:%S GMT")
-        response.set_cookie(
-            request.POST['cookie_key'],
-            request.POST['cookie_value'],
-            max_age=(days * 24 * 60 * 60),
-            expires=expires,
-            domain=settings.SESSION_COOKIE_DOMAIN,
-            secure=settings.SESSION_COOKIE_SECURE or None,
-        )
+        set_cookie(response, request.POST['cookie_key'],
+                   request.POST['cookie_value'],
+                   days=int(request.POST.get('cookie_days', 100)))
+        return response
+
+
+class UpdateSessionAndCookiesAJAXView(View):
+    """
+    View to update several session variables and cookies in one AJAX post.
+
+    Post a JSON object like this::
+
+        {"session": {"foo": "bar"}, "cookies": {"baz": "1"}, "cookie_days": 7}
+
+    or the form encoded equivalent::
+
+        session[foo]=bar&cookies[baz]=1&cookie_days=7
+
+    The session is only saved, if one of its values has actually changed.
+
+    """
+    def dispatch(self, request, *args, **kwargs):
+        if not (self.request.headers.get('x-requested-with') == 'XMLHttpRequest' and request.method == 'POST'):
+            return HttpResponseForbidden()
+        try:
+            data = self.get_data()
+        except (TypeError, ValueError):
+            return HttpResponseBadRequest()
+        for key, value in data['session'].items():
+            # Setting a value marks the session as modified, which makes the
+            # middleware save it, so we only touch values that have changed.
+            if key not in request.session or request.session[key] != value:
+                request.session[key] = value
+        response = HttpResponse('done')
+        for key, value in data['cookies'].items():
+            set_cookie(response, key, str(value), days=data['cookie_days'])
         return response
+
+    def get_data(self):
+        """Returns the posted session variables and cookies."""
+        if self.request.content_type == 'application/json':
+            data = json.loads(self.request.body.decode('utf-8'))
+            if not isinstance(data, dict):
+                raise ValueError('Expected a JSON object.')
+            data.setdefault('session', {})
+            data.setdefault('cookies', {})
+            if not all(isinstance(data[key], dict)
+                       for key in ('session', 'cookies')):
+                raise ValueError('Expected JSON objects.')
+            days = data.setdefault('cookie_days', 100)
+            # ``bool`` is a subclass of ``int``
+            if not isinstance(days, int) or isinstance(days, bool):
+                raise TypeError('Expected an integer for cookie_days.')
+            return data
+        data = {'session': {}, 'cookies': {},
+                'cookie_days': int(self.request.POST.get('cookie_days', 100))}
+        for key, value in self.request.POST.items():
+            for prefix in ('session', 'cookies'):
+                if key.startswith(prefix + '[') and key.endswith(']'):
+                    data[prefix][key[len(prefix) + 1:-1]] = value
+        return data
@@ -1,11 +1,39 @@
 """Useful mixins for class based views."""
-import json
-import os
+import csv
+import datetime
+import hashlib
+import time
+from decimal import Decimal
 
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, HttpResponseRedirect
-from django.views.generic import DetailView
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db.models.query import QuerySet
+from django.http import (
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
+from django.template import TemplateDoesNotExist, loader
+from django.template.base import TextNode
+from django.template.context import make_context
+from django.template.defaulttags import ForNode
+from django.template.loader_tags import (
+    BLOCK_CONTEXT_KEY,
+    BlockContext,
+    BlockNode,
+    ExtendsNode,
+)
+from django.utils import dateformat, timezone, translation
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.views.generic import DetailView, ListView
+from django.views.generic.detail import SingleObjectMixin
+
+from .format_utils import get_format
+from .utils.serializers import get_separators, get_serializer
 
 
 class AccessMixin(object):
@@ -25,6 +53,251 @@ class AccessMixin(object):
             request, *args, **kwargs)
 
 
+# Maps view classes, prefixes and template names to the resolved ajax
+# template names.
+_ajax_template_names = {}
+# Maps template names to ``True`` or ``False``, depending on their existence.
+_template_exists = {}
+# Maps template and block names to the compiled template and block node.
+_template_blocks = {}
+
+
+def template_exists(template_name):
+    """
+    Returns ``True`` if the template can be loaded.
+
+    The result is cached for the life of the process, unless ``DEBUG`` is
+    ``True``.
+
+    """
+    if template_name in _template_exists and not settings.DEBUG:
+        return _template_exists[template_name]
+    try:
+        loader.get_template(template_name)
+    except TemplateDoesNotExist:
+        _template_exists[template_name] = False
+    else:
+        _template_exists[template_name] = True
+    return _template_exists[template_name]
+
+
+def get_block_node(template, block_name):
+    """
+    Returns the compiled template and node of a block.
+
+    ``template`` is a compiled Django template. If the block isn't defined in
+    the template itself, it is looked up in the templates it extends. The
+    result is cached per template for the life of the process, unless
+    ``DEBUG`` is ``True``.
+
+    """
+    key = (template.origin.name, template.name, block_name)
+    if key in _template_blocks and not settings.DEBUG:
+        return _template_blocks[key]
+    result = None
+    for node in template.nodelist.get_nodes_by_type(BlockNode):
+        if node.name == block_name:
+            result = (template, node)
+            break
+    else:
+        extends = template.nodelist.get_nodes_by_type(ExtendsNode)
+        parent_name = extends and extends[0].parent_name
+        if (parent_name and not parent_name.filters
+                and isinstance(parent_name.var, str)):
+            result = get_block_node(
+                template.engine.get_template(parent_name.var), block_name)
+    if result is None:
+        raise ImproperlyConfigured(
+            'The block "{0}" could not be found in "{1}".'.format(
+                block_name, template.name))
+    _template_blocks[key] = result
+    return result
+
+
+class BlockTemplate(object):
+    """
+    Template-like object that renders a single block of a template.
+
+    Neither the base templates nor any other blocks are rendered. Please note,
+    that ``{{ block.super }}`` is not available inside of the block.
+
+    """
+    def __init__(self, template, block_name):
+        self.template = template
+        self.block_name = block_name
+
+    def render(self, context=None, request=None):
+        template, node = get_block_node(
+            self.template.template, self.block_name)
+        context = make_context(context, request,
+                               autoescape=template.engine.autoescape)
+        with context.render_context.push_state(template):
+            with context.bind_template(template):
+                context.template_name = template.name
+                return node.render(context)
+
+
+class StreamingTemplate(object):
+    """
+    Template-like object that renders a template as a generator.
+
+    ``{% extends %}``, ``{% block %}`` and ``{% for %}`` tags are rendered
+    node by node, all other tags are rendered at once. The output is yielded
+    after every block in ``flush_blocks`` (after every block, if it's
+    ``None``) and after every ``chunk_size`` iterations of a loop.
+
+    Loops don't turn their sequence into a list. Querysets are fetched with
+    ``.iterator()``, which means ``forloop.revcounter`` and
+    ``forloop.revcounter0`` are only available for sequences with a length.
+    Querysets with ``prefetch_related`` are evaluated as usual, because
+    ``.iterator()`` would ignore the prefetching.
+
+    """
+    def __init__(self, template, flush_blocks=None, chunk_size=100):
+        self.template = template
+        self.flush_blocks = flush_blocks
+        self.chunk_size = chunk_size
+
+    def render(self, context=None, request=None):
+        template = self.template.template
+        context = make_context(context, request,
+                               autoescape=template.engine.autoescape)
+        output = []
+        with context.render_context.push_state(template):
+            with context.bind_template(template):
+                context.template_name = template.name
+                for bit in self.iter_nodelist(template.nodelist, context):
+                    if bit is not None:
+                        output.append(bit)
+                    elif output:
+                        yield ''.join(output)
+                        output = []
+        if output:
+            yield ''.join(output)
+
+    def iter_nodelist(self, nodelist, context):
+        """
+        Yields the rendered nodes of a node list.
+
+        ``None`` is yielded whenever the output should be flushed.
+
+        """
+        for node in nodelist:
+            if isinstance(node, ExtendsNode):
+                iterator = self.iter_extends_node(node, context)
+            elif isinstance(node, BlockNode):
+                iterator = self.iter_block_node(node, context)
+            elif isinstance(node, ForNode):
+                iterator = self.iter_for_node(node, context)
+            else:
+                yield node.render_annotated(context)
+                continue
+            for bit in iterator:
+                yield bit
+
+    def iter_extends_node(self, node, context):
+        """Does the same as ``ExtendsNode.render`` node by node."""
+        compiled_parent = node.get_parent(context)
+        if BLOCK_CONTEXT_KEY not in context.render_context:
+            context.render_context[BLOCK_CONTEXT_KEY] = BlockContext()
+        block_context = context.render_context[BLOCK_CONTEXT_KEY]
+        block_context.add_blocks(node.blocks)
+        for parent_node in compiled_parent.nodelist:
+            if not isinstance(parent_node, TextNode):
+                if not isinstance(parent_node, ExtendsNode):
+                    block_context.add_blocks(dict(
+                        (n.name, n) for n in
+                        compiled_parent.nodelist.get_nodes_by_type(BlockNode)))
+                break
+        with context.render_context.push_state(
+                compiled_parent, isolated_context=False):
+            for bit in self.iter_nodelist(compiled_parent.nodelist, context):
+                yield bit
+
+    def iter_block_node(self, node, context):
+        """Does the same as ``BlockNode.render`` node by node."""
+        block_context = context.render_context.get(BLOCK_CONTEXT_KEY)
+        with context.push():
+            push = None
+            if block_context is None:
+                block = node
+            else:
+                push = block = block_context.pop(node.name)
+                if block is None:
+                    block = node
+                block = type(node)(block.name, block.nodelist)
+                block.context = context
+            context['block'] = block
+            for bit in self.iter_nodelist(block.nodelist, context):
+                yield bit
+            if push is not None:
+                block_context.push(node.name, push)
+        if self.flush_blocks is None or node.name in self.flush_blocks:
+            yield None
+
+    def iter_for_node(self, node, context):
+        """Does the same as ``ForNode.render`` item by item."""
+        parentloop = context['forloop'] if 'forloop' in context else {}
+        with context.push():
+            values = node.sequence.resolve(context, ignore_failures=True)
+            if values is None:
+                values = []
+            if (isinstance(values, QuerySet) and values._result_cache is None
+                    and not values._prefetch_related_lookups):
+                # ``iterator()`` ignores ``prefetch_related``
+                values = values.iterator(chunk_size=self.chunk_size)
+            if node.is_reversed:
+                values = reversed(list(values))
+            len_values = len(values) if hasattr(values, '__len__') else None
+            iterator = iter(values)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                yield node.nodelist_empty.render(context)
+                return
+            num_loopvars = len(node.loopvars)
+            loop_dict = context['forloop'] = {'parentloop': parentloop}
+            i = 0
+            while True:
+                # We need to know the next item to know if this is the last
+                try:
+                    next_item = next(iterator)
+                    is_last = False
+                except StopIteration:
+                    is_last = True
+                loop_dict['counter0'] = i
+                loop_dict['counter'] = i + 1
+                if len_values is not None:
+                    loop_dict['revcounter'] = len_values - i
+                    loop_dict['revcounter0'] = len_values - i - 1
+                loop_dict['first'] = (i == 0)
+                loop_dict['last'] = is_last
+                pop_context = False
+                if num_loopvars > 1:
+                    try:
+                        len_item = len(item)
+                    except TypeError:
+                        len_item = 1
+                    if num_loopvars != len_item:
+                        raise ValueError(
+                            'Need {0} values to unpack in for loop; got {1}. '
+                            .format(num_loopvars, len_item))
+                    context.update(dict(zip(node.loopvars, item)))
+                    pop_context = True
+                else:
+                    context[node.loopvars[0]] = item
+                for bit in self.iter_nodelist(node.nodelist_loop, context):
+                    yield bit
+                if pop_context:
+                    context.pop()
+                if (i + 1) % self.chunk_size == 0:
+                    yield None
+                if is_last:
+                    break
+                item = next_item
+                i += 1
+
+
 class AjaxResponseMixin(object):
     """
     A mixin that prepends `ajax_` to the template name when it is an ajax call.
@@ -32,23 +305,178 @@ class AjaxResponseMixin(object):
     This gives you the chance to return partial templates when it is an ajax
     call, so you can render the output inside of a modal, for example.
 
+    If there is no `ajax_` version of a template, the normal template is used.
+
+    If you set ``ajax_block_name``, ajax calls will render only that block of
+    the normal template instead of a separate `ajax_` template.
+
     """
     ajax_template_prefix = 'ajax_'
+    ajax_block_name = None
+
+    def is_ajax(self):
+        return (self.request.headers.get('x-requested-with')
+                == 'XMLHttpRequest')
 
     def get_template_names(self):
         names = super(AjaxResponseMixin, self).get_template_names()
-        if self.request.headers.get('x-requested-with') == 'XMLHttpRequest':
-            count = 0
-            for name in names:
-                filename_split = list(os.path.split(name))
-                old_filename = filename_split[-1]
-                new_filename = '{0}{1}'.format(
-                    self.ajax_template_prefix, old_filename)
-                filename_split[-1] = new_filename
-                names[count] = os.path.join(*filename_split)
-                count += 1
+        if self.is_ajax() and not self.ajax_block_name:
+            key = (type(self), self.ajax_template_prefix, tuple(names))
+            if key not in _ajax_template_names or settings.DEBUG:
+                _ajax_template_names[key] = [
+                    self.get_ajax_template_name(name) for name in names]
+            return list(_ajax_template_names[key])
         return names
 
+    def get_ajax_template_name(self, name):
+        """
+        Returns the ajax version of a template name.
+
+        Falls back to the given name, if only the normal template exists.
+
+        """
+        head, sep, tail = name.rpartition('/')
+        ajax_name = '{0}{1}{2}{3}'.format(
+            head, sep, self.ajax_template_prefix, tail)
+        if not template_exists(ajax_name) and template_exists(name):
+            return name
+        return ajax_name
+
+    def render_to_response(self, context, **response_kwargs):
+        if not (self.ajax_block_name and self.is_ajax()):
+            return super(AjaxResponseMixin, self).render_to_response(
+                context, **response_kwargs)
+        response_kwargs.setdefault('content_type', self.content_type)
+        template = loader.select_template(
+            self.get_template_names(), using=self.template_engine)
+        return self.response_class(
+            request=self.request,
+            template=BlockTemplate(template, self.ajax_block_name),
+            context=context,
+            using=self.template_engine,
+            **response_kwargs
+        )
+
+
+class StreamingTemplateResponseMixin(object):
+    """
+    A mixin that streams the rendered template to the client.
+
+    The first bytes are sent before the whole page has been rendered, which
+    is useful for very large list pages. Set ``streaming_flush_blocks`` to a
+    list of block names after which the output should be sent. By default, it
+    is sent after every block. Loops send their output every
+    ``streaming_chunk_size`` iterations.
+
+    """
+    streaming_flush_blocks = None
+    streaming_chunk_size = 100
+
+    def render_to_response(self, context, **response_kwargs):
+        response_kwargs.setdefault('content_type', self.content_type)
+        template = loader.select_template(
+            self.get_template_names(), using=self.template_engine)
+        streaming_template = StreamingTemplate(
+            template, flush_blocks=self.streaming_flush_blocks,
+            chunk_size=self.streaming_chunk_size)
+        return StreamingHttpResponse(
+            streaming_template.render(context, self.request),
+            **response_kwargs
+        )
+
+
+class ConditionalGetMixin(object):
+    """
+    A mixin for detail views that answers conditional GET requests.
+
+    Before the object is fetched or the template is rendered, a cheap query
+    for the primary key and the ``last_modified_field`` of the object is run.
+    If the client already has the current version, a ``304 Not Modified`` is
+    returned right away.
+
+    Successful requests with other methods than GET and HEAD (e.g. the post
+    actions of the ``DetailViewWithPostAction``) invalidate the object's ETag,
+    even if they didn't change its ``last_modified_field``.
+
+    """
+    last_modified_field = 'modified'
+
+    def dispatch(self, request, *args, **kwargs):
+        response = super(ConditionalGetMixin, self).dispatch(
+            request, *args, **kwargs)
+        if (request.method not in ('GET', 'HEAD')
+                and response.status_code < 400
+                and getattr(self, 'object', None) is not None):
+            cache.set(self.get_conditional_cache_key(self.object.pk),
+                      time.time(), timeout=None)
+        return response
+
+    def get(self, request, *args, **kwargs):
+        values = self.get_conditional_values()
+        if values is None:
+            # Let the view raise the 404
+            return super(ConditionalGetMixin, self).get(
+                request, *args, **kwargs)
+        pk, modified = values
+        changed = cache.get(self.get_conditional_cache_key(pk))
+        last_modified = modified and self.get_timestamp(modified)
+        if changed and (not last_modified or changed > last_modified):
+            last_modified = changed
+        user = getattr(request, 'user', None)
+        etag = quote_etag(hashlib.md5('{0}:{1}:{2}:{3}:{4}'.format(
+            pk, modified and modified.isoformat(), changed,
+            getattr(user, 'pk', None),
+            translation.get_language()).encode('utf-8')).hexdigest())
+        last_modified = last_modified and int(last_modified)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super(ConditionalGetMixin, self).get(
+                request, *args, **kwargs)
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        # The ETag depends on the user
+        patch_vary_headers(response, ('Cookie', ))
+        return response
+
+    def get_conditional_cache_key(self, pk):
+        return 'django_libs:conditional_get:{0}:{1}'.format(
+            self.get_queryset().model._meta.label_lower, pk)
+
+    def get_conditional_values(self):
+        """
+        Returns the primary key and the last modification of the object.
+
+        Returns ``None`` if the object doesn't exist. If the view overrides
+        ``get_object``, the object is fetched with it, so it is fetched twice
+        on a cache miss. Override this method to query the values cheaply.
+
+        """
+        if type(self).get_object is not SingleObjectMixin.get_object:
+            obj = self.get_object()
+            return obj.pk, getattr(obj, self.last_modified_field)
+        queryset = self.get_queryset()
+        pk = self.kwargs.get(self.pk_url_kwarg)
+        slug = self.kwargs.get(self.slug_url_kwarg)
+        if pk is not None:
+            queryset = queryset.filter(pk=pk)
+        if slug is not None and (pk is None or self.query_pk_and_slug):
+            queryset = queryset.filter(**{self.get_slug_field(): slug})
+        if pk is None and slug is None:
+            raise AttributeError(
+                'Generic detail view {0} must be called with either an object'
+                ' pk or a slug in the URLconf.'.format(type(self).__name__))
+        return queryset.values_list('pk', self.last_modified_field).first()
+
+    def get_timestamp(self, modified):
+        """Returns the timestamp of a ``date`` or ``datetime``."""
+        if not isinstance(modified, datetime.datetime):
+            modified = datetime.datetime.combine(modified, datetime.time())
+        if timezone.is_naive(modified):
+            modified = timezone.make_aware(modified)
+        return modified.timestamp()
+
 
 class DetailViewWithPostAction(DetailView):
     """
@@ -77,6 +505,57 @@ class DetailViewWithPostAction(DetailView):
         return HttpResponseRedirect(success_url)
 
 
+class ListViewWithPostAction(ListView):
+    """
+    Generic class based view to handle bulk post actions in a ListView.
+
+    This is the list counterpart of the ``DetailViewWithPostAction``. Your
+    buttons need to be called `post_actionname` and you have to implement
+    action handlers with the name `post_actionname`. The handlers receive a
+    queryset of the selected objects, whose primary keys are posted in the
+    field `selected_objects_field`, so they can update or delete all of them
+    with one query.
+
+    Success urls are retrieved like in the ``DetailViewWithPostAction``. If
+    neither `get_success_url_post_actionname` nor `get_success_url` is
+    implemented, the user is redirected to the current page.
+
+    """
+    selected_objects_field = 'selected'
+
+    @classmethod
+    def get_post_actions(cls):
+        """Returns the names of all action handlers of the class."""
+        if '_post_action_names' not in cls.__dict__:
+            # Only inspect the class once, not on every request
+            cls._post_action_names = tuple(sorted(
+                name for name in dir(cls)
+                if name.startswith('post_') and callable(getattr(cls, name))))
+        return cls._post_action_names
+
+    def post(self, request, *args, **kwargs):
+        for action in self.get_post_actions():
+            if action in request.POST:
+                break
+        else:
+            return HttpResponseBadRequest()
+        queryset = self.get_queryset()
+        pk_field = queryset.model._meta.pk
+        try:
+            pks = [pk_field.to_python(pk) for pk in request.POST.getlist(
+                self.selected_objects_field)]
+        except (ValueError, ValidationError):
+            # Invalid primary keys have been posted
+            return HttpResponseBadRequest()
+        getattr(self, action)(queryset.filter(pk__in=pks))
+        success_url_handler = getattr(
+            self, 'get_success_url_%s' % action, False)
+        if not success_url_handler:
+            success_url_handler = getattr(
+                self, 'get_success_url', request.get_full_path)
+        return HttpResponseRedirect(success_url_handler())
+
+
 class JSONResponseMixin(object):
     """
     A mixin that can be used to render a JSON response.
@@ -84,8 +563,20 @@ class JSONResponseMixin(object):
     Taken from here: https://docs.djangoproject.com/en/dev/topics/
     class-based-views/#more-than-just-html
 
+    Set ``json_serializer`` to the name of a registered serializer or the path
+    to a function to override the ``DJANGO_LIBS_JSON_SERIALIZER`` setting.
+
+    If ``json_streaming`` is ``True``, the response is streamed and querysets
+    in the context are fetched and serialized in chunks of
+    ``json_chunk_size`` rows, so huge querysets never have to be held in
+    memory completely. Streaming doesn't use ``convert_context_to_json``, so
+    it can't be combined with an override of it.
+
     """
     response_class = HttpResponse
+    json_serializer = None
+    json_streaming = False
+    json_chunk_size = 2000
 
     def render_to_response(self, context, **response_kwargs):
         """
@@ -93,18 +584,165 @@ class JSONResponseMixin(object):
 
         """
         response_kwargs['content_type'] = 'application/json'
+        if self.json_streaming:
+            if (type(self).convert_context_to_json
+                    is not JSONResponseMixin.convert_context_to_json):
+                raise ImproperlyConfigured(
+                    '{0} overrides convert_context_to_json, which is not used'
+                    ' by json_streaming.'.format(type(self).__name__))
+            return StreamingHttpResponse(
+                self.iter_context_json(context),
+                **response_kwargs
+            )
         return self.response_class(
             self.convert_context_to_json(context),
             **response_kwargs
         )
 
+    def iter_context_json(self, context):
+        """
+        Yields the JSON representation of the context in chunks.
+
+        Querysets in the context (or the context itself, if it's a queryset)
+        are serialized as lists of their ``values()``, just like
+        ``convert_context_to_json`` would do.
+
+        """
+        serializer = get_serializer(self.json_serializer)
+        if isinstance(context, QuerySet):
+            for chunk in self.iter_queryset_json(context, serializer):
+                yield chunk
+            return
+        if not isinstance(context, dict):
+            yield serializer(context)
+            return
+        item_separator, key_separator = get_separators(serializer)
+        yield '{'
+        for index, (key, value) in enumerate(context.items()):
+            yield '{0}{1}{2}'.format(item_separator if index else '',
+                                     serializer(str(key)), key_separator)
+            if isinstance(value, QuerySet):
+                for chunk in self.iter_queryset_json(value, serializer):
+                    yield chunk
+            else:
+                yield serializer(value)
+        yield '}'
+
+    def iter_queryset_json(self, queryset, serializer):
+        """Yields a JSON list of the values of a queryset in chunks."""
+        yield '['
+        rows = []
+        separator = ''
+        item_separator = get_separators(serializer)[0]
+        for row in queryset.values().iterator(chunk_size=self.json_chunk_size):
+            rows.append(row)
+            if len(rows) == self.json_chunk_size:
+                # Serialize the whole chunk as a list and strip its brackets
+                yield separator + serializer(rows)[1:-1]
+                separator = item_separator
+                rows = []
+        if rows:
+            yield separator + serializer(rows)[1:-1]
+        yield ']'
+
     def convert_context_to_json(self, context):
         """
         Convert the context dictionary into a JSON object.
 
-        If your context has complex Django objects, you need to override this
-        method and make sure that the context gets transformed into something
-        that ``json.dumps`` can handle.
+        Dates, decimals, lazy strings, model instances and querysets are
+        handled by the serializer. If your context has other complex objects,
+        you need to override this method and make sure that the context gets
+        transformed into something that can be serialized.
 
         """
-        return json.dumps(context)
+        return get_serializer(self.json_serializer)(context)
+
+
+class Echo(object):
+    """Pseudo-buffer that returns the written value instead of storing it."""
+    def write(self, value):
+        return value
+
+
+class CSVResponseMixin(object):
+    """
+    A mixin that streams a queryset as CSV file.
+
+    Set ``csv_fields`` to the fields, that should be exported. The rows are
+    fetched with ``values_list(*csv_fields).iterator()`` in chunks of
+    ``csv_chunk_size`` rows, so the memory usage doesn't grow with the number
+    of rows. Dates, times and numbers are formatted according to the format
+    of the currently active language.
+
+    """
+    csv_fields = None
+    csv_headers = None
+    csv_delimiter = ','
+    csv_filename = None
+    csv_chunk_size = 2000
+    csv_content_type = 'text/csv'
+
+    def get_csv_queryset(self, context):
+        """Returns the queryset to export. Defaults to the ``object_list``."""
+        if context.get('object_list') is not None:
+            return context['object_list']
+        return self.get_queryset()
+
+    def get_csv_fields(self):
+        if self.csv_fields is None:
+            raise ImproperlyConfigured(
+                'Please set `csv_fields` on the view that inherits the'
+                ' CSVResponseMixin')
+        return self.csv_fields
+
+    def get_csv_headers(self):
+        if self.csv_headers is None:
+            return self.get_csv_fields()
+        return self.csv_headers
+
+    def render_to_response(self, context, **response_kwargs):
+        response_kwargs['content_type'] = self.csv_content_type
+        response = StreamingHttpResponse(
+            self.iter_csv(context), **response_kwargs)
+        if self.csv_filename:
+            response['Content-Disposition'] = (
+                'attachment; filename="{0}"'.format(self.csv_filename))
+        return response
+
+    def iter_csv(self, context):
+        """Yields the rows of the CSV file in chunks."""
+        # The writer returns the written line instead of storing it
+        writer = csv.writer(Echo(), delimiter=self.csv_delimiter)
+        formats = {
+            'date': get_format('SHORT_DATE_FORMAT'),
+            'datetime': get_format('SHORT_DATETIME_FORMAT'),
+            'time': get_format('TIME_FORMAT'),
+            'decimal_separator': get_format('DECIMAL_SEPARATOR'),
+        }
+        rows = [writer.writerow([str(h) for h in self.get_csv_headers()])]
+        queryset = self.get_csv_queryset(context).values_list(
+            *self.get_csv_fields())
+        for row in queryset.iterator(chunk_size=self.csv_chunk_size):
+            rows.append(writer.writerow([
+                self.format_csv_value(value, formats) for value in row]))
+            if len(rows) >= self.csv_chunk_size:
+                yield ''.join(rows)
+                rows = []
+        if rows:
+            yield ''.join(rows)
+
+    def format_csv_value(self, value, formats):
+        """Returns the string representation of a value for the CSV file."""
+        if value is None:
+            return ''
+        if isinstance(value, datetime.datetime):
+            if timezone.is_aware(value):
+                value = timezone.localtime(value)
+            return dateformat.format(value, formats['datetime'])
+        if isinstance(value, datetime.date):
+            return dateformat.format(value, formats['date'])
+        if isinstance(value, datetime.time):
+            return dateformat.time_format(value, formats['time'])
+        if isinstance(value, (Decimal, float)):
+            return str(value).replace('.', formats['decimal_separator'])
+        return value